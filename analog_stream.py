@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import argparse
+import os
+import struct
+
+import numpy as np
+import numpy.typing as npt
+
+# sample values of each plot_analog.convert_to_analog_signal method, computed from the complex frames
+SIGNALS = {
+    'magnitude': np.abs,
+    'phase': np.angle,
+    'i_values': np.real,
+    'q_values': np.imag,
+}
+
+# RIFF/WAVE header for mono IEEE float32 samples (format tag 3). The sizes,
+# sample count and sample rate are written again by close(). The second chunk
+# is a JUNK chunk of the size of an RF64 ds64 chunk: if the file grows past
+# 4 GiB, close() turns it into an RF64 file with the 64-bit sizes in ds64 and
+# 0xFFFFFFFF in the 32-bit size fields (EBU Tech 3306).
+_WAV_HEADER = struct.Struct('<4sI4s4sIQQQI4sIHHIIHHH4sII4sI')
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_DS64_SIZE = 28
+_UINT32_MAX = 0xFFFFFFFF
+
+
+class DecayingPeakNormalizer:
+    # Normalizes a stream of frames to -1..1 by a running peak instead of the
+    # peak of each frame, so the gain is continuous across frames.
+    # The peak follows a louder frame immediately and otherwise decays by half
+    # every `half_life` frames; within a frame the gain is ramped linearly from
+    # the previous peak to the new one, so a quieter stretch fades in smoothly.
+    def __init__(self, half_life: float = 50.0) -> None:
+        self.log_decay = np.log(0.5) / half_life
+        self.peak = 0.0
+
+    def __call__(self, signal: npt.NDArray[np.floating]) -> npt.NDArray[np.floating]:
+        # signal: (frames, samples per frame), normalized in place and returned
+        frame_peaks = np.max(np.abs(signal), axis=1)
+        num_frames = len(frame_peaks)
+        k = np.arange(1, num_frames + 1)
+
+        # peak_k = max(frame_peak_k, peak_{k-1} * decay) for all k at once, in the log
+        # domain: log peak_k = k log decay + max_{j<=k}(log frame_peak_j - j log decay)
+        log_peaks = np.log(np.maximum(np.concatenate(([self.peak], frame_peaks)), np.finfo(float).tiny))
+        offsets = log_peaks - np.arange(num_frames + 1) * self.log_decay
+        peaks = np.exp(np.maximum.accumulate(offsets)[1:] + k * self.log_decay)
+        previous = np.concatenate(([self.peak], peaks[:-1]))
+        self.peak = float(peaks[-1])
+
+        # louder frames use their new peak from the first sample on
+        start = np.where(frame_peaks >= previous * np.exp(self.log_decay), peaks, previous)
+        ramp = np.arange(1, signal.shape[1] + 1) / signal.shape[1]
+        envelope = start[:, None] + (peaks - start)[:, None] * ramp
+        np.maximum(envelope, np.finfo(float).tiny, out=envelope)
+        signal /= envelope
+        # the envelope is never below the samples, this only removes rounding overshoot
+        np.clip(signal, -1.0, 1.0, out=signal)
+        return signal
+
+
+class AnalogSignalWriter:
+    # Turns frames into one continuous float32 signal (one of SIGNALS, samples
+    # in sweep-major order like convert_to_analog_signal) and writes it to a
+    # WAV (path ending in .wav) or raw little endian float32 file.
+    #
+    # Samples are collected in a preallocated block of `block_size` samples
+    # that is written out when full, so memory use does not depend on the
+    # length of the session. If sample_rate is not given it is estimated from
+    # the result ticks (frame rate x samples per frame) when the file is closed;
+    # a WAV file needs at least two frames with different ticks for that.
+    # WAV files larger than 4 GiB (about 2**30 samples) are written as RF64.
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        method: str = 'magnitude',
+        sample_rate: int | None = None,
+        half_life: float = 50.0,
+        block_size: int = 1 << 16,
+    ) -> None:
+        if method not in SIGNALS:
+            raise ValueError(f"지원되지 않는 변환 방법: {method}")
+        if sample_rate is not None and sample_rate <= 0:
+            raise ValueError(f'sample_rate must be positive, got {sample_rate}')
+        self.path = path
+        self.method = method
+        self.sample_rate = sample_rate
+        self.normalizer = DecayingPeakNormalizer(half_life)
+        self.wav = os.fspath(path).lower().endswith('.wav')
+
+        self.block = np.empty(block_size, dtype='<f4')
+        self.fill = 0
+        self.num_samples = 0
+        self.num_frames = 0
+        self.samples_per_frame = None
+        self._first_tick = None
+        self._last_tick = None
+        self._ticks_per_second = None
+
+        self._file = open(path, 'wb')
+        if self.wav:
+            self._file.write(self._wav_header())
+
+    def _wav_header(self) -> bytes:
+        sample_rate = self.sample_rate or 0
+        data_size = self.num_samples * 4
+        riff_size = _WAV_HEADER.size - 8 + data_size
+        if riff_size <= _UINT32_MAX:
+            riff_id, ds64 = b'RIFF', (b'JUNK', _DS64_SIZE, 0, 0, 0, 0)
+        else:
+            riff_id, ds64 = b'RF64', (b'ds64', _DS64_SIZE, riff_size, data_size, self.num_samples, 0)
+            riff_size = data_size = _UINT32_MAX
+        return _WAV_HEADER.pack(
+            riff_id, riff_size, b'WAVE',
+            *ds64,
+            b'fmt ', 18, _WAVE_FORMAT_IEEE_FLOAT, 1, sample_rate, sample_rate * 4, 4, 32, 0,
+            b'fact', 4, min(self.num_samples, _UINT32_MAX),
+            b'data', data_size,
+        )
+
+    def write_frames(self, frames, ticks=None, ticks_per_second=None) -> None:
+        # frames: one (sweeps, points) frame or a (frames, sweeps, points) stack
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+            ticks = None if ticks is None else [ticks]
+        if self.sample_rate is None and ticks is None:
+            raise ValueError('ticks are needed to estimate the sample rate when no sample_rate is given')
+
+        signal = SIGNALS[self.method](frames).reshape(len(frames), -1).astype(np.float64)
+        self.samples_per_frame = signal.shape[1]
+        self.normalizer(signal)
+        self._append(signal.ravel())
+
+        if ticks is not None:
+            if self._first_tick is None:
+                self._first_tick = int(ticks[0])
+            self._last_tick = int(ticks[-1])
+            self._ticks_per_second = ticks_per_second
+        self.num_frames += len(frames)
+
+    def write_result(self, result) -> None:
+        # a single a121.Result, as returned by get_next() for a non-extended session
+        self.write_frames(result.frame, result.tick, result._context.ticks_per_second)
+
+    def _append(self, samples) -> None:
+        while len(samples) > 0:
+            n = min(len(samples), len(self.block) - self.fill)
+            self.block[self.fill : self.fill + n] = samples[:n]
+            self.fill += n
+            samples = samples[n:]
+            if self.fill == len(self.block):
+                self._flush()
+
+    def _flush(self) -> None:
+        self.block[: self.fill].tofile(self._file)
+        self.num_samples += self.fill
+        self.fill = 0
+
+    def estimated_sample_rate(self) -> int | None:
+        if self._first_tick is None or self.num_frames < 2 or self._last_tick == self._first_tick:
+            return None
+        frame_rate = (self.num_frames - 1) * self._ticks_per_second / (self._last_tick - self._first_tick)
+        return round(frame_rate * self.samples_per_frame)
+
+    def close(self) -> None:
+        try:
+            self._flush()
+            if self.sample_rate is None:
+                self.sample_rate = self.estimated_sample_rate()
+            if self.wav:
+                if not self.sample_rate:
+                    # a WAV header with sample rate 0 is invalid
+                    raise ValueError(
+                        f'{self.path}: no sample_rate given and none can be estimated from {self.num_frames} '
+                        'frame(s) (needs two frames with different ticks); the samples are written, '
+                        'but the WAV header is not. Give sample_rate (--sample-rate)'
+                    )
+                self._file.seek(0)
+                self._file.write(self._wav_header())
+        finally:
+            self._file.close()
+
+    def __enter__(self) -> AnalogSignalWriter:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def summary(self) -> str:
+        seconds = self.num_samples / self.sample_rate if self.sample_rate else float('nan')
+        return f'{self.num_samples} samples from {self.num_frames} frames at {self.sample_rate} Hz ({seconds:.1f} s)'
+
+
+def export_recording(recording_path, output_path, method='magnitude', group_idx=0, sensor_id=None,
+                     sample_rate=None, half_life=50.0, chunk_frames=1024):
+    # converts a recording (see recording.py) chunk by chunk, never loading it as a whole
+    from recording import Recording
+
+    recording = Recording(recording_path)
+    if sensor_id is None:
+        sensor_id = next(iter(recording.extended_metadata[group_idx]))
+    ticks = recording.ticks(group_idx, sensor_id)
+    with AnalogSignalWriter(output_path, method, sample_rate, half_life) as writer:
+        for start in range(0, len(recording), chunk_frames):
+            stop = min(start + chunk_frames, len(recording))
+            frames = recording.frames(group_idx, sensor_id, start, stop, dtype=np.complex64)
+            writer.write_frames(frames, ticks[start:stop], recording.ticks_per_second)
+    return writer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='convert a recording into a continuous float32 analog signal')
+    parser.add_argument('recording')
+    parser.add_argument('output', help='.wav for a WAV file, anything else for raw float32 samples')
+    parser.add_argument('--method', choices=sorted(SIGNALS), default='magnitude')
+    parser.add_argument('--group', type=int, default=0)
+    parser.add_argument('--sensor', type=int, default=None)
+    parser.add_argument('--sample-rate', type=int, default=None, help='default: estimated from the ticks')
+    parser.add_argument('--half-life', type=float, default=50.0, help='peak normalizer half life in frames')
+    args = parser.parse_args()
+    writer = export_recording(
+        args.recording, args.output, args.method, args.group, args.sensor, args.sample_rate, args.half_life
+    )
+    print(writer.summary())
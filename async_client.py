@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from acconeer.exptool import a121
+
+from replay_client import open_client
+from streaming import _first_entry
+
+
+class AsyncClient:
+    # asyncio front end for a blocking client (a121.Client or ReplayClient).
+    # Every call runs in a thread of its own executor, so the calls of one
+    # client stay in order while a slow serial link only blocks its own thread.
+    #
+    #   client = await AsyncClient.open(serial_port="COM4")
+    #   await client.setup_session(sensor_config)
+    #   await client.start_session()
+    #   async for result in client:
+    #       ...
+    def __init__(self, client, name=None) -> None:
+        self.client = client
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"client-{name}")
+
+    @classmethod
+    async def open(cls, name=None, **kwargs) -> AsyncClient:
+        # open_client(**kwargs) without blocking the event loop
+        loop = asyncio.get_running_loop()
+        client = await loop.run_in_executor(None, functools.partial(open_client, **kwargs))
+        return cls(client, name)
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @property
+    def server_info(self) -> a121.ServerInfo:
+        return self.client.server_info
+
+    async def setup_session(self, config):
+        return await self._call(self.client.setup_session, config)
+
+    async def start_session(self) -> None:
+        await self._call(self.client.start_session)
+
+    async def get_next(self):
+        return await self._call(self.client.get_next)
+
+    async def stop_session(self) -> None:
+        await self._call(self.client.stop_session)
+
+    async def close(self) -> None:
+        await self._call(self.client.close)
+        self._executor.shutdown(wait=False)
+
+    async def results(self):
+        # results until the task is cancelled or get_next() raises
+        while True:
+            yield await self.get_next()
+
+    def __aiter__(self):
+        return self.results()
+
+
+async def merge_by_tick(clients, queue_size: int = 8, max_wait: float = 0.5):
+    # Reads all clients concurrently and yields (client, result) ordered by
+    # acquisition time. The tick counters of different modules are unrelated,
+    # so each client's ticks are mapped onto the host clock using its first
+    # result (the same way as StreamingPipeline), then merged.
+    #
+    # A result is only yielded once every client has a result waiting, unless
+    # a client has had nothing for `max_wait` seconds; such a stalled client
+    # stops holding back the others and its results are yielded as they arrive.
+    #
+    # Use it with contextlib.aclosing(): the readers are only stopped when the
+    # generator is closed, and a loop left with break does not close it.
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in clients]
+
+    async def read(client, queue):
+        try:
+            async for result in client:
+                await queue.put((time.perf_counter(), result))
+        except Exception as e:
+            await queue.put((None, e))
+
+    loop = asyncio.get_running_loop()
+    readers = [asyncio.create_task(read(client, queue)) for client, queue in zip(clients, queues)]
+    getters = {i: asyncio.create_task(queue.get()) for i, queue in enumerate(queues)}
+    missing_since = dict.fromkeys(getters, loop.time())
+    tick_offsets = [None] * len(clients)
+    heads = []
+    sequence = 0
+
+    try:
+        while True:
+            for i, getter in list(getters.items()):
+                if not getter.done():
+                    continue
+                del getters[i]
+                received, result = getter.result()
+                if isinstance(result, Exception):
+                    raise result
+                tick_time = _first_entry(result).tick_time
+                if tick_offsets[i] is None:
+                    tick_offsets[i] = received - tick_time
+                heapq.heappush(heads, (tick_offsets[i] + tick_time, sequence, i, result))
+                sequence += 1
+
+            now = loop.time()
+            waiting = [i for i in getters if now - missing_since[i] < max_wait]
+            if waiting:
+                deadline = min(missing_since[i] for i in waiting) + max_wait
+                await asyncio.wait(
+                    [getters[i] for i in waiting], timeout=deadline - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                continue
+            if not heads:
+                # every client is stalled
+                await asyncio.wait(getters.values(), return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            _, _, i, result = heapq.heappop(heads)
+            getters[i] = asyncio.create_task(queues[i].get())
+            missing_since[i] = loop.time()
+            yield clients[i], result
+    finally:
+        tasks = readers + list(getters.values())
+        for task in tasks:
+            task.cancel()
+        # wait until they are cancelled, so no reader submits another get_next()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run(client_kwargs, sensor_config, duration=None, report_interval=2.0):
+    # drives several sensors from one process and reports the merged stream
+    clients = await asyncio.gather(
+        *(AsyncClient.open(name=str(i), **kwargs) for i, kwargs in enumerate(client_kwargs))
+    )
+    await asyncio.gather(*(client.setup_session(sensor_config) for client in clients))
+    await asyncio.gather(*(client.start_session() for client in clients))
+    print(f"{len(clients)} sensors running, press Ctrl-C to stop")
+
+    counts = dict.fromkeys((client.name for client in clients), 0)
+    start = last_report = time.perf_counter()
+    try:
+        # closed before the sessions are stopped, so its readers are no longer calling get_next()
+        async with contextlib.aclosing(merge_by_tick(clients)) as merged:
+            async for client, result in merged:
+                counts[client.name] += 1
+                now = time.perf_counter()
+                if now - last_report >= report_interval:
+                    rates = ", ".join(f"{name}: {n / (now - start):.1f} Hz" for name, n in counts.items())
+                    print(f"{sum(counts.values())} results ({rates})")
+                    last_report = now
+                if duration is not None and now - start >= duration:
+                    break
+    finally:
+        await asyncio.gather(*(client.stop_session() for client in clients), return_exceptions=True)
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="acquire from several XM125 modules in one process")
+    parser.add_argument("--serial-port", nargs="+", default=[], help="one serial port per module")
+    parser.add_argument("--mock", type=int, default=0, help="number of mock clients to add")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default: until Ctrl-C)")
+    args = parser.parse_args()
+
+    client_kwargs = [{"serial_port": port, "override_baudrate": 115200} for port in args.serial_port]
+    client_kwargs += [{"mock": True}] * args.mock
+    if not client_kwargs:
+        parser.error("give at least one --serial-port or --mock")
+
+    sensor_config = a121.SensorConfig(num_points=100, sweeps_per_frame=10, hwaas=16)
+    try:
+        asyncio.run(run(client_kwargs, sensor_config, args.duration))
+    except KeyboardInterrupt:
+        pass
@@ -2,10 +2,11 @@
 # All rights reserved
 
 from acconeer.exptool import a121
+from replay_client import open_client
 
 
 # Client is an object that is used to interact with the sensor.
-client = a121.Client.open(
+client = open_client(
     # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
     # or
     # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
@@ -2,49 +2,22 @@
 # All rights reserved
 
 from acconeer.exptool import a121
+from replay_client import open_client
 import numpy as np
 import matplotlib.pyplot as plt
-# Client is an object that is used to interact with the sensor.
-client = a121.Client.open(
-    # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
-    # or
-    # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
-    # or
-    # usb_device=True,
-    # or
-    # mock=True,
-    serial_port='COM4',
-    override_baudrate=115200
-)
-
-# Once the client is connected, information about the server can be accessed.
-print("Server Info:")
-print(client.server_info)
-
-# In order to get radar data from the server, we need to start a session.
-
-# To be able to start a session, we must first configure the session
-'''
-sensor_config = a121.SensorConfig()
-sensor_config.start_point=25
-sensor_config.step_length=2
-sensor_config.num_points=30
-sensor_config.hwaas = 10
-client.setup_session(sensor_config)
-'''
-
-sensor_config = a121.SensorConfig()
-sensor_config.num_points = 15
-sensor_config.sweeps_per_frame = 10
-sensor_config.hwaas = 16
-client.setup_session(sensor_config)
-
-# Now we are ready to start it:
-client.start_session()
+
+
+# per-sample text labels are only drawn up to this many samples (per heatmap or
+# scatter plot); above it they cover the plot and their rendering time dominates
+ANNOTATION_LIMIT = 200
+# the line plots only get a legend entry per frame/sweep up to this many rows
+LEGEND_LIMIT = 10
+
 
 def custom_graph(result):
     # 실수부와 허수부 추출
     rows, cols = result.shape
+    annotate = rows * cols <= ANNOTATION_LIMIT
     real_part = np.real(result)
     imag_part = np.imag(result)
 
@@ -58,10 +31,9 @@ def custom_graph(result):
     plt.title('Real(I) heatmap')
     plt.xlabel('distance point')
     plt.ylabel('frame/sweep')
-    for i in range(rows):
-        for j in range(cols):
-            plt.text(j, i, f"{real_part[i, j]:.0f}", 
-                    ha="center", va="center", color="white", fontsize=9)
+    if annotate:
+        for (i, j), value in np.ndenumerate(real_part):
+            plt.text(j, i, f"{value:.0f}", ha="center", va="center", color="white", fontsize=9)
 
     # 허수부 히트맵
     plt.subplot(122)
@@ -70,10 +42,9 @@ def custom_graph(result):
     plt.title('Imaginary(Q) heatmap')
     plt.xlabel('distance point')
     plt.ylabel('frame/sweep')
-    for i in range(rows):
-        for j in range(cols):
-            plt.text(j, i, f"{imag_part[i, j]:.0f}", 
-                    ha="center", va="center", color="white", fontsize=9)
+    if annotate:
+        for (i, j), value in np.ndenumerate(imag_part):
+            plt.text(j, i, f"{value:.0f}", ha="center", va="center", color="white", fontsize=9)
 
     plt.tight_layout()
     plt.savefig('iq_heatmap.png')
@@ -84,23 +55,23 @@ def custom_graph(result):
 
     # 실수부 선 그래프
     plt.subplot(211)
-    for i in range(rows):
-        plt.plot(real_part[i, :], 'o-', label=f'frame/sweep {i+1}')
+    lines = plt.plot(real_part.T, 'o-')
     plt.grid(True)
     plt.title('Real(I) value')
     plt.xlabel('distance point')
     plt.ylabel('Amplitude')
-    plt.legend()
+    if rows <= LEGEND_LIMIT:
+        plt.legend(lines, [f'frame/sweep {i+1}' for i in range(rows)])
 
     # 허수부 선 그래프
     plt.subplot(212)
-    for i in range(rows):
-        plt.plot(imag_part[i, :], 'o-', label=f'frame/sweep {i+1}')
+    lines = plt.plot(imag_part.T, 'o-')
     plt.grid(True)
     plt.title('Imaginary(Q) value')
     plt.xlabel('distance point')
     plt.ylabel('Amplitude')
-    plt.legend()
+    if rows <= LEGEND_LIMIT:
+        plt.legend(lines, [f'frame/sweep {i+1}' for i in range(rows)])
 
     plt.tight_layout()
     plt.savefig('iq_lineplot.png')
@@ -132,9 +103,10 @@ def custom_graph(result):
         plt.ylabel('Imaginary part(Q)')
         
         
-        for j in range(cols):
-            plt.annotate(f"{j}", (real_part[i, j], imag_part[i, j]), 
-                        fontsize=9, xytext=(5, 5), textcoords='offset points')
+        if cols <= ANNOTATION_LIMIT:
+            for j in range(cols):
+                plt.annotate(f"{j}", (real_part[i, j], imag_part[i, j]), 
+                            fontsize=9, xytext=(5, 5), textcoords='offset points')
 
     plt.tight_layout()
     plt.savefig('iq_scatter.png')
@@ -148,23 +120,23 @@ def custom_graph(result):
 
     # 진폭 그래프
     plt.subplot(211)
-    for i in range(rows):
-        plt.plot(magnitude[i, :], 'o-', label=f'frame/sweep {i+1}')
+    lines = plt.plot(magnitude.T, 'o-')
     plt.grid(True)
     plt.title('signal amplitude(abs)')
     plt.xlabel('distance point')
     plt.ylabel('Amplitude')
-    plt.legend()
+    if rows <= LEGEND_LIMIT:
+        plt.legend(lines, [f'frame/sweep {i+1}' for i in range(rows)])
 
     # 위상 그래프
     plt.subplot(212)
-    for i in range(rows):
-        plt.plot(phase[i, :], 'o-', label=f'frame/sweep {i+1}')
+    lines = plt.plot(phase.T, 'o-')
     plt.grid(True)
     plt.title('signal phase')
     plt.xlabel('distance point')
     plt.ylabel('phase(degree)')
-    plt.legend()
+    if rows <= LEGEND_LIMIT:
+        plt.legend(lines, [f'frame/sweep {i+1}' for i in range(rows)])
 
     plt.tight_layout()
     plt.savefig('magnitude_phase.png')
@@ -211,16 +183,60 @@ def custom_graph(result):
     plt.savefig('iq_3d.png')
     plt.close()
 
-n = 1
-results=[]
-for i in range(n):
-
-    result = client.get_next()
-    results.append(result.frame)
-    print(f"Result {i + 1}:")
-    print(result)
-    
-client.close()
 
-for result in results:
-    custom_graph(result)
\ No newline at end of file
+def main():
+    # Client is an object that is used to interact with the sensor.
+    client = open_client(
+        # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+        # or
+        # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+        # or
+        # usb_device=True,
+        # or
+        # mock=True,
+        serial_port='COM4',
+        override_baudrate=115200
+    )
+
+    # Once the client is connected, information about the server can be accessed.
+    print("Server Info:")
+    print(client.server_info)
+
+    # In order to get radar data from the server, we need to start a session.
+
+    # To be able to start a session, we must first configure the session
+    '''
+    sensor_config = a121.SensorConfig()
+    sensor_config.start_point=25
+    sensor_config.step_length=2
+    sensor_config.num_points=30
+    sensor_config.hwaas = 10
+    client.setup_session(sensor_config)
+    '''
+
+    sensor_config = a121.SensorConfig()
+    sensor_config.num_points = 15
+    sensor_config.sweeps_per_frame = 10
+    sensor_config.hwaas = 16
+    client.setup_session(sensor_config)
+
+    # Now we are ready to start it:
+    client.start_session()
+
+    n = 1
+    results=[]
+    for i in range(n):
+
+        result = client.get_next()
+        results.append(result.frame)
+        print(f"Result {i + 1}:")
+        print(result)
+
+    client.close()
+
+    for result in results:
+        custom_graph(result)
+
+
+if __name__ == "__main__":
+    main()
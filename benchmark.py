@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Benchmarks every processing and plotting path of the scripts in this repo on
+# synthetic frames or on frames from a recording (see recording.py), for a
+# matrix of num_points x sweeps_per_frame sizes. Each (stage, size) runs in a
+# fresh process so the reported peak RSS belongs to that stage alone.
+#
+#   python benchmark.py --points 15 100 --sweeps 10 64 --output before.json
+#   python benchmark.py --points 15 100 --sweeps 10 64 --compare before.json
+
+STAGES = {}
+
+
+def stage(name, png=False):
+    # registers a stage; the decorated function gets a BenchmarkInput and
+    # returns a function that processes frame number i
+    def register(setup):
+        STAGES[name] = (setup, png)
+        return setup
+
+    return register
+
+
+class BenchmarkInput:
+    def __init__(self, num_points, sweeps_per_frame, num_frames, recording_path=None, seed=0):
+        from acconeer.exptool import a121
+
+        from recording import Recording, make_result
+
+        if recording_path is not None:
+            recording = Recording(recording_path)
+            self.session_config = recording.session_config
+            self.extended_metadata = recording.extended_metadata
+            self.ticks_per_second = recording.ticks_per_second
+            self.sensor_id = next(iter(self.extended_metadata[0]))
+            self.raw_frames = np.array(recording.raw_frames(0, self.sensor_id)[:num_frames])
+            self.extended_results = [
+                _as_extended(self.session_config, recording.result(i)) for i in range(len(self.raw_frames))
+            ]
+        else:
+            self.sensor_id = 1
+            self.session_config = a121.SessionConfig(
+                [{self.sensor_id: a121.SensorConfig(num_points=num_points, sweeps_per_frame=sweeps_per_frame)}],
+                extended=True,
+            )
+            metadata = a121.Metadata(
+                frame_data_length=sweeps_per_frame * num_points,
+                sweep_data_length=num_points,
+                subsweep_data_offset=np.array([0]),
+                subsweep_data_length=np.array([num_points]),
+                calibration_temperature=25,
+                tick_period=0,
+                base_step_length_m=0.0025,
+                max_sweep_rate=10000.0,
+            )
+            self.extended_metadata = [{self.sensor_id: metadata}]
+            self.ticks_per_second = 1000
+
+            rng = np.random.default_rng(seed)
+            self.raw_frames = np.zeros(
+                (num_frames, sweeps_per_frame, num_points), dtype=[("real", "<i2"), ("imag", "<i2")]
+            )
+            self.raw_frames["real"] = rng.integers(-2000, 2000, self.raw_frames.shape)
+            self.raw_frames["imag"] = rng.integers(-2000, 2000, self.raw_frames.shape)
+            self.extended_results = [
+                [{self.sensor_id: make_result(raw, metadata, self.ticks_per_second, tick=i)}]
+                for i, raw in enumerate(self.raw_frames)
+            ]
+
+        self.frames = self.raw_frames["real"] + 1j * self.raw_frames["imag"]
+        self.sweeps_per_frame, self.num_points = self.frames.shape[1:]
+
+
+def _as_extended(session_config, result):
+    if session_config.extended:
+        return result
+    return [{session_config.sensor_id: result}]
+
+
+@stage("A121Visualizer.process_frame_data")
+def _(data):
+    from plot_analog2 import A121Visualizer
+
+    visualizer = A121Visualizer(data.num_points, data.sweeps_per_frame)
+    return lambda i: visualizer.process_frame_data(data.frames[i])
+
+
+@stage("process_complex_frame")
+def _(data):
+    from plot_analog import process_complex_frame
+
+    return lambda i: process_complex_frame(data.frames[i])
+
+
+@stage("convert_to_analog_signal")
+def _(data):
+    from plot_analog import convert_to_analog_signal, process_complex_frame
+
+    processed = [process_complex_frame(frame) for frame in data.frames]
+    return lambda i: convert_to_analog_signal(processed[i], 'magnitude')
+
+
+@stage("AnalogSignalWriter")
+def _(data):
+    from analog_stream import AnalogSignalWriter
+
+    writer = AnalogSignalWriter("analog.wav")
+    return lambda i: writer.write_frames(data.frames[i], i, data.ticks_per_second)
+
+
+@stage("sparse_iq.Processor")
+def _(data):
+    from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod, Processor, ProcessorConfig
+
+    processor_config = ProcessorConfig()
+    processor_config.amplitude_method = AmplitudeMethod.COHERENT
+    processor = Processor(session_config=data.session_config, processor_config=processor_config)
+    return lambda i: processor.process(data.extended_results[i])
+
+
+@stage("SelectiveProcessor")
+def _(data):
+    from sparse_iq_select import SelectiveProcessor
+
+    processor = SelectiveProcessor(data.session_config, data.extended_metadata, [(0, data.sensor_id, 0)])
+    return lambda i: processor.process(data.extended_results[i])
+
+
+@stage("RangeDopplerEngine")
+def _(data):
+    from range_doppler import RangeDopplerEngine
+
+    engine = RangeDopplerEngine(data.sweeps_per_frame)
+    return lambda i: engine.process(data.frames[i])
+
+
+@stage("RangeDopplerEngine (int16)")
+def _(data):
+    from range_doppler import RangeDopplerEngine
+
+    engine = RangeDopplerEngine(data.sweeps_per_frame)
+    return lambda i: engine.process(data.raw_frames[i])
+
+
+def _pg_updater(data, **kwargs):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import pyqtgraph as pg
+
+    from plot import PGUpdater
+
+    app = pg.mkQApp()
+    win = pg.GraphicsLayoutWidget()
+    updater = PGUpdater(data.session_config, data.extended_metadata, **kwargs)
+    updater.setup(win)
+    win.show()
+
+    def update(i):
+        updater.update(data.extended_results[i])
+        # let Qt repaint, like the event loop of et.PGProcess would
+        app.processEvents()
+
+    # the plots are deleted together with the window unless it is kept alive
+    update.window = win
+    return update
+
+
+@stage("PGUpdater.update")
+def _(data):
+    return _pg_updater(data)
+
+
+@stage("PGUpdater.update (averaging)")
+def _(data):
+    return _pg_updater(data, averaging_frames=10)
+
+
+@stage("custom_graph", png=True)
+def _(data):
+    from basic_plot import custom_graph
+
+    return lambda i: custom_graph(data.frames[i])
+
+
+@stage("plot_iq_data", png=True)
+def _(data):
+    from plot_analog import plot_iq_data, process_complex_frame
+
+    processed = [process_complex_frame(frame) for frame in data.frames]
+    return lambda i: plot_iq_data(processed[i])
+
+
+@stage("plot_analog_signals", png=True)
+def _(data):
+    from plot_analog import plot_analog_signals, process_complex_frame
+
+    processed = [process_complex_frame(frame) for frame in data.frames]
+    return lambda i: plot_analog_signals(processed[i])
+
+
+@stage("A121Visualizer.plot_distance_line", png=True)
+def _(data):
+    from plot_analog2 import A121Visualizer
+
+    visualizer = A121Visualizer(data.num_points, data.sweeps_per_frame)
+    processed = [visualizer.process_frame_data(frame) for frame in data.frames]
+    return lambda i: visualizer.plot_distance_line(processed[i])
+
+
+@stage("A121Visualizer.plot_sweep_line", png=True)
+def _(data):
+    from plot_analog2 import A121Visualizer
+
+    visualizer = A121Visualizer(data.num_points, data.sweeps_per_frame)
+    processed = [visualizer.process_frame_data(frame) for frame in data.frames]
+    return lambda i: visualizer.plot_sweep_line(processed[i])
+
+
+@stage("LinePanelExporter", png=True)
+def _(data):
+    from line_panel_renderer import LinePanelExporter
+    from plot_analog2 import A121Visualizer
+
+    visualizer = A121Visualizer(data.num_points, data.sweeps_per_frame)
+    processed = [visualizer.process_frame_data(frame) for frame in data.frames]
+    exporter = LinePanelExporter("png", workers=0)
+    return lambda i: exporter.submit(i, processed[i])
+
+
+@stage("range_doppler.save_heatmap", png=True)
+def _(data):
+    from range_doppler import RangeDopplerEngine
+    from render_pool import save_heatmap
+    from session_axes import SessionAxes
+
+    maps = RangeDopplerEngine(data.sweeps_per_frame).process(data.frames)
+    axes = SessionAxes(data.session_config, data.extended_metadata)
+    x_axis_label = axes.distances(0, data.sensor_id)
+    y_axis_label = axes.velocities(0, data.sensor_id)
+    return lambda i: save_heatmap(i, maps[i], x_axis_label, y_axis_label)
+
+
+@stage("range_doppler.HeatmapRenderer", png=True)
+def _(data):
+    from heatmap_renderer import HeatmapRenderer
+    from range_doppler import RangeDopplerEngine
+    from session_axes import SessionAxes
+
+    maps = RangeDopplerEngine(data.sweeps_per_frame).process(data.frames)
+    axes = SessionAxes(data.session_config, data.extended_metadata)
+    renderer = HeatmapRenderer(axes.distances(0, data.sensor_id), axes.velocities(0, data.sensor_id), maps.shape[1:])
+    return lambda i: renderer.render(i, maps[i])
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_stage(name, num_points, sweeps_per_frame, num_frames, recording_path=None):
+    # runs in its own process, see run_benchmarks()
+    setup, png = STAGES[name]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="xm125_benchmark_") as workdir:
+        # the PNG exports write into fixed relative paths
+        for subdir in ("distance_point", "sweep", "range_velocity_map"):
+            os.makedirs(os.path.join(workdir, subdir))
+        os.chdir(workdir)
+        try:
+            if png:
+                import matplotlib.pyplot as plt
+
+                plt.switch_backend("Agg")
+
+            data = BenchmarkInput(num_points, sweeps_per_frame, num_frames, recording_path)
+            process = setup(data)
+            process(0)  # warm up imports and caches
+
+            latencies = np.empty(num_frames)
+            start = time.perf_counter()
+            for i in range(num_frames):
+                t = time.perf_counter()
+                process(i % len(data.frames))
+                latencies[i] = time.perf_counter() - t
+            total = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "stage": name,
+        "num_points": int(data.num_points),
+        "sweeps_per_frame": int(data.sweeps_per_frame),
+        "frames": num_frames,
+        "frames_per_second": num_frames / total,
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_benchmarks(stages, points, sweeps, num_frames, num_png_frames, recording_path=None):
+    if recording_path is not None:
+        # the recording decides the frame size
+        points, sweeps = [None], [None]
+
+    results = []
+    context = mp.get_context("spawn")
+    for name, num_points, sweeps_per_frame in itertools.product(stages, points, sweeps):
+        frames = num_png_frames if STAGES[name][1] else num_frames
+        # a fresh process per stage, so peak RSS and caches are not shared between stages
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+            result = executor.submit(
+                run_stage, name, num_points, sweeps_per_frame, frames, recording_path
+            ).result()
+        print(_format(result))
+        results.append(result)
+    return results
+
+
+def _format(result, baseline=None):
+    rss = "-" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.0f}"
+    line = (
+        f"{result['stage']:36s} {result['num_points']:5d} x {result['sweeps_per_frame']:<4d}"
+        f"{result['frames_per_second']:10.1f} fps  p50 {result['p50_ms']:8.2f} ms"
+        f"  p99 {result['p99_ms']:8.2f} ms  rss {rss:>5s} MB"
+    )
+    if baseline is not None:
+        line += f"  ({result['frames_per_second'] / baseline['frames_per_second']:.2f}x baseline)"
+    return line
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {
+            (r["stage"], r["num_points"], r["sweeps_per_frame"]): r for r in json.load(f)["results"]
+        }
+    print(f"\ncompared to {baseline_path}:")
+    for result in results:
+        key = (result["stage"], result["num_points"], result["sweeps_per_frame"])
+        print(_format(result, baseline.get(key)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the processing and plotting paths")
+    parser.add_argument("--stages", nargs="+", choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument("--points", nargs="+", type=int, default=[15, 100], help="num_points values")
+    parser.add_argument("--sweeps", nargs="+", type=int, default=[10, 64], help="sweeps_per_frame values")
+    parser.add_argument("--frames", type=int, default=200, help="frames per numeric stage")
+    parser.add_argument("--png-frames", type=int, default=3, help="frames per PNG export stage")
+    parser.add_argument("--recording", help="use frames from this recording instead of synthetic ones")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="JSON", help="earlier --output to compare throughput with")
+    args = parser.parse_args()
+
+    recording_path = os.path.abspath(args.recording) if args.recording else None
+    results = run_benchmarks(
+        args.stages, args.points, args.sweeps, args.frames, args.png_frames, recording_path
+    )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "recording": args.recording,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"results saved to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import math
+import multiprocessing as mp
+import threading
+import time
+from typing import Any, Callable
+
+import acconeer.exptool as et
+
+
+class LatestMailbox:
+    # Latest-value-wins mailbox with one slot per key (e.g. one per client).
+    # put() replaces a value that has not been taken yet and counts it as
+    # dropped; take() returns and clears all pending values at once.
+    def __init__(self) -> None:
+        self._items = {}
+        self._condition = threading.Condition()
+        self.num_put = 0
+        self.num_dropped = 0
+
+    def put(self, key, value) -> None:
+        with self._condition:
+            if key in self._items:
+                self.num_dropped += 1
+            self._items[key] = value
+            self.num_put += 1
+            self._condition.notify()
+
+    def take(self, timeout: float | None = None) -> dict:
+        # waits up to `timeout` seconds for at least one value, {} if none arrived
+        with self._condition:
+            self._condition.wait_for(lambda: self._items, timeout)
+            items, self._items = self._items, {}
+            return items
+
+
+def _pg_process_alive(pg_process) -> bool:
+    # et.PGProcess has no public liveness check; put_data() only raises
+    # PGProccessDiedException when called, and nothing is sent while waiting
+    # for an acknowledgement. This is the same test put_data() makes, on the
+    # private _exit_event (set when the window is closed) and _process of
+    # PGProcess as of acconeer-exptool 7.x (checked with 7.18.2). If they are
+    # gone, the process is taken as alive and put_data() notices a closed window.
+    exit_event = getattr(pg_process, "_exit_event", None)
+    process = getattr(pg_process, "_process", None)
+    if exit_event is None or process is None:
+        return True
+    return not exit_event.is_set() and process.exitcode is None
+
+
+class _AcknowledgingUpdater:
+    # Runs in the PGProcess. Wraps the real updater, acknowledges every update
+    # and reports the display latency (host receive time to drawn) back through
+    # shared memory: [number of updates, last, max, sum of latencies in seconds].
+    def __init__(self, updater, shared) -> None:
+        self.updater = updater
+        self.shared = shared
+
+    def setup(self, win):
+        self.updater.setup(win)
+
+    def update(self, items) -> None:
+        self.updater.update({key: data for key, (_, data) in items.items()})
+        # time.monotonic is system wide, so receive times from the main process compare
+        latency = time.monotonic() - min(received for received, _ in items.values())
+        with self.shared.get_lock():
+            self.shared[0] += 1
+            self.shared[1] = latency
+            self.shared[2] = max(self.shared[2], latency)
+            self.shared[3] += latency
+
+
+class DisplayLink:
+    # Backpressure between acquisition and an et.PGProcess.
+    #
+    # put(key, data) never blocks: data goes into a LatestMailbox, so under load
+    # older unsent results are dropped instead of queueing up. A sender thread
+    # forwards the pending results to the plot process only once it has drawn
+    # the previous update (at most `max_in_flight` updates in flight), so the
+    # plot always shows data that is at most one redraw old.
+    #
+    # The updater gets {key: data} with the latest data of every key that
+    # changed since its previous update. If `encode` is given, encode(key, data)
+    # is sent instead of data; it runs in the sender thread for sent data only
+    # (see shm_transport.SharedFrameSender.send).
+    def __init__(
+        self,
+        updater,
+        max_freq: float = 60,
+        max_in_flight: int = 1,
+        report_interval: float = 0,
+        encode: Callable[[Any, Any], Any] | None = None,
+    ) -> None:
+        self.shared = mp.Array("d", [0.0, math.nan, 0.0, 0.0])
+        # no subsampling in the plot process: every update sent is drawn and acknowledged
+        self.pg_process = et.PGProcess(
+            _AcknowledgingUpdater(updater, self.shared), max_freq=max_freq, allow_subsampling=False
+        )
+        self.mailbox = LatestMailbox()
+        self.max_in_flight = max_in_flight
+        self.encode = encode
+        self.report_interval = report_interval
+        self.num_sent = 0
+        self.error: BaseException | None = None
+
+        self._stop_event = threading.Event()
+        self._sender = threading.Thread(target=self._send, name="display-link", daemon=True)
+
+    def start(self) -> None:
+        self.pg_process.start()
+        self._sender.start()
+
+    def put(self, key, data) -> None:
+        if self.error is not None:
+            raise self.error
+        self.mailbox.put(key, (time.monotonic(), data))
+
+    @property
+    def num_displayed(self) -> int:
+        return int(self.shared[0])
+
+    def _send(self) -> None:
+        last_report = time.perf_counter()
+        try:
+            while not self._stop_event.is_set():
+                if self.num_sent - self.num_displayed >= self.max_in_flight:
+                    # put_data() only notices a closed window when called
+                    if not _pg_process_alive(self.pg_process):
+                        self.pg_process.close()
+                        raise et.PGProccessDiedException
+                    time.sleep(0.001)
+                    continue
+                items = self.mailbox.take(timeout=0.1)
+                if items:
+                    if self.encode is not None:
+                        items = {key: (received, self.encode(key, data)) for key, (received, data) in items.items()}
+                    self.pg_process.put_data(items)
+                    self.num_sent += 1
+
+                if self.report_interval > 0 and time.perf_counter() - last_report >= self.report_interval:
+                    print(self.summary())
+                    last_report = time.perf_counter()
+        except BaseException as e:
+            self.error = e
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._sender.is_alive():
+            self._sender.join()
+        self.pg_process.close()
+
+    def summary(self) -> str:
+        with self.shared.get_lock():
+            num_displayed, last, max_, total = self.shared[:]
+        mean = total / num_displayed if num_displayed else math.nan
+        return (
+            f"received {self.mailbox.num_put}, dropped {self.mailbox.num_dropped}, "
+            f"displayed {int(num_displayed)} updates, display latency ms "
+            f"last {last * 1000:.1f} mean {mean * 1000:.1f} max {max_ * 1000:.1f}"
+        )
@@ -117,129 +117,164 @@ class SensorConfig:
             msg = "Cannot pass an empty `subsweeps` list."
             raise ValueError(msg)
 '''
-from acconeer.exptool import a121
+from replay_client import open_client
 import acconeer.exptool as et
-from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod, Processor, ProcessorConfig
-import numpy as np
 import time
-import matplotlib.pyplot as plt
-def get_distance_axis(config,distance_velocity_map):
-    #get distance range
-    start_m=config.start_point * 0.0025
-    step_m = config.step_length * 0.0025
-
-    x_axis_label = [start_m + step_m * idx for idx in range(distance_velocity_map.shape[1])]
-    return x_axis_label
-
-def get_velocity_axis(config,max_sweep_rate):
-    #c=299792458
-    wavelength = 299792458.0 / 6e+10 / 2
-    prf = config.prf.frequency
-    
-    pri = 1.0/prf
-
-    if config.sweep_rate is not None:
-        sweep_rate = config.sweep_rate
-    else:
-        sweep_rate = max_sweep_rate
-
-    sweep_period = 1.0/sweep_rate
-
-    v_max=wavelength / (4*sweep_period)
-   
-    
-    velocities = np.linspace(-v_max, v_max, config.sweeps_per_frame)
-    return velocities
-
-# Client is an object that is used to interact with the sensor.
-client = a121.Client.open(
-    # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
-    # or
-    # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
-    # or
-    # usb_device=True,
-    # or
-    # mock=True,
-    serial_port='COM4',
-    override_baudrate=115200
-)
-
-# Once the client is connected, information about the server can be accessed.
-print("Server Info:")
-print(client.server_info)
-
-# In order to get radar data from the server, we need to start a session.
-processor_config = ProcessorConfig()
-
-processor_config.amplitude_method = AmplitudeMethod.COHERENT  # Either COHERENT or FFTMAX
-sensor_id = 1
-# To be able to start a session, we must first configure the session
-sensor_config = a121.SensorConfig()
-sensor_config.num_points = 100
-sensor_config.sweeps_per_frame = 10
-sensor_config.step_length=3
-sensor_config.hwaas = 16
-
-
-# Now we are ready to start it:
-
-session_config = a121.SessionConfig(
-        [{sensor_id: sensor_config}],
-        extended=True,
+from ring_buffer import FrameRingBuffer
+from streaming import StreamingPipeline
+from range_doppler import RangeDopplerEngine
+from render_pool import HeatmapRenderPool
+from heatmap_renderer import HeatmapRenderer
+from session_axes import SessionAxes
+from recording import INT16_COMPLEX, Recorder
+from frame_stats import AcquisitionStats
+from profiles import load_profile
+from live_range_doppler import LiveRangeDopplerView
+
+# session profile (name in profiles/ or path to a .toml/.json file, see profiles.py)
+PROFILE = "range_doppler"
+
+# number of most recent frames kept in memory while capturing.
+# older frames are overwritten, so memory use does not grow with session length.
+# Frames are kept as the int16 pairs sent by the sensor (4 bytes per point, a quarter of complex128)
+RETENTION_FRAMES = 300
+
+# STREAMING=True processes and saves each result while capturing instead of after client.close().
+# QUEUE_SIZE is the number of results that may wait for processing before acquisition blocks
+STREAMING = False
+QUEUE_SIZE = 8
+
+# number of processes writing the PNG files after capture (None = one per CPU core, 0 = no extra processes)
+RENDER_WORKERS = None
+
+# if set, every raw result is also appended to this recording file (see recording.py)
+RECORD_PATH = None
+
+# seconds between acquisition rate / jitter reports while capturing (0 = only at the end)
+STATS_INTERVAL = 5.0
+
+# LIVE_VIEW=True also shows the distance velocity map in a window while capturing
+# (see live_range_doppler.py); the PNG files are written as before
+LIVE_VIEW = False
+
+def main(profile=PROFILE):
+    # The session is configured by a profile (see profiles/range_doppler.toml). It is
+    # loaded before the client is opened, so an invalid profile fails before the sensor is connected
+    profile = load_profile(profile)
+    session_config = profile.session_config
+    # the range doppler map is made from the first sensor of the first group
+    sensor_id, sensor_config = profile.first_sensor
+
+    # Client is an object that is used to interact with the sensor.
+    client = open_client(
+        # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+        # or
+        # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+        # or
+        # usb_device=True,
+        # or
+        # mock=True,
+        serial_port='COM4',
+        override_baudrate=115200
     )
-client.setup_session(session_config)
-client.start_session()
-processor = Processor(session_config=session_config, processor_config=processor_config)
-interrupt_handler = et.utils.ExampleInterruptHandler()
-print("Press Ctrl-C to end session")
-results=[]
-i=0
-start=time.time()
-while not interrupt_handler.got_signal:
-    result = client.get_next()
-    results.append(result)
-    print(f'result {i} is collected at {round((time.time() - start)*1000,3)} milliseconds')
-    
-    i=i+1
-print("Disconnecting...")
-client.close()
-
-print("Distance velocity results of first group")
-
-# sensor config of 1st subsweep from second group is in session_config.groups[1][sensor_id]
-print(f'Maximum Measureable Distance: {session_config.groups[0][sensor_id].prf.mmd}')
-print(f'Maximum Unambiguous Range: {session_config.groups[0][sensor_id].prf.mur}')
-print(session_config.groups[0][sensor_id])
-for i,result in enumerate(results):
-        result_sensor_configs = processor.process(result)
-        
-        # Sparse IQ results contain amplitudes, phases, and distance velocity
+
+    # Once the client is connected, information about the server can be accessed.
+    print("Server Info:")
+    print(client.server_info)
+
+    # In order to get radar data from the server, we need to start a session
+    # with the profile loaded above:
+    extended_metadata = profile.setup_session(client)
+    client.start_session()
+    recorder = Recorder(RECORD_PATH, session_config, extended_metadata, client.server_info) if RECORD_PATH else None
+    ring_buffer = FrameRingBuffer.from_sensor_config(sensor_config, RETENTION_FRAMES, dtype=INT16_COMPLEX)
+    interrupt_handler = et.utils.ExampleInterruptHandler()
+    print("Press Ctrl-C to end session")
+    engine = RangeDopplerEngine(sensor_config.sweeps_per_frame)
+    # range and velocity axes are fixed for the whole session
+    session_axes = SessionAxes(session_config, extended_metadata)
+    x_axis_label = session_axes.distances(0, sensor_id)
+    y_axis_label = session_axes.velocities(0, sensor_id)
+    stats = AcquisitionStats(sensor_config.frame_rate, report_interval=STATS_INTERVAL)
+    live_view = None
+    if LIVE_VIEW:
+        live_view = LiveRangeDopplerView(session_config, extended_metadata, client.server_info.ticks_per_second)
+        live_view.start()
+
+    def on_receive(result):
+        nonlocal live_view
+        stats.record(result)
+        if live_view is not None:
+            try:
+                live_view.put(result)
+            except et.PGProccessDiedException:
+                # the window was closed, capturing goes on until Ctrl-C
+                live_view.close()
+                live_view = None
+
+    def close_live_view():
+        if live_view is not None:
+            live_view.close()
+            print(live_view.summary())
+
+    if STREAMING:
+        renderer = None
+
+        def process_result(i, result):
+            nonlocal renderer
+            if recorder is not None:
+                recorder.write(result)
+            # the raw frame, converted to complex64 inside the engine instead of complex128 by result.frame
+            distance_velocity_map = engine.process(result[0][sensor_id]._frame)
+            if renderer is None:
+                # the figure is built once and only its image data is updated per result
+                renderer = HeatmapRenderer(x_axis_label, y_axis_label, distance_velocity_map.shape)
+            renderer.render(i, distance_velocity_map)
+
+        pipeline = StreamingPipeline(client, process_result, queue_size=QUEUE_SIZE, on_receive=on_receive)
+        pipeline.start()
+        while not interrupt_handler.got_signal and pipeline.running:
+            time.sleep(0.1)
+        print("Disconnecting...")
         try:
-            #print("Amplitudes results of 3rd subsweep from first group ")
-            #print(result_third_subsweep.amplitudes)
-
-            # sensor config
-            #https://docs.acconeer.com/en/latest/exploration_tool/api/a121.html
-            
-            distance_velocity_map = result_sensor_configs[0][sensor_id][0].distance_velocity_map
-            #print(distance_velocity_map)
-            #print(f'size: {distance_velocity_map.shape}')
-            
-            x_axis_label = get_distance_axis(session_config.groups[0][sensor_id],distance_velocity_map)
-            y_axis_label = get_velocity_axis(session_config.groups[0][sensor_id],result[0][sensor_id]._context.metadata.max_sweep_rate)
-
-            plt.figure(figsize=(12, 8))
-            
-            plt.imshow(distance_velocity_map, aspect='auto', origin='lower', cmap='hot', interpolation='nearest',
-               extent=[x_axis_label[0], x_axis_label[-1], y_axis_label[0], y_axis_label[-1]])
-            plt.colorbar(label='Magnitude (dB)')
-            plt.xlabel('Range (m)')
-            plt.ylabel('Velocity (m/s)')
-            plt.title(f'range-doppler heatmap (results {i})')
-            plt.tight_layout()
-            plt.savefig(f'./range_velocity_map/results{i}.png')
-            print(f'figure {i} has been saved')
-            plt.close()
-            
-        except et.PGProccessDiedException:
-            break
+            pipeline.stop()
+        finally:
+            # also after a processing error, so the session ends and the recording is complete
+            client.close()
+            close_live_view()
+            if recorder is not None:
+                recorder.close()
+        print(stats.summary())
+        print(pipeline.summary())
+    else:
+        while not interrupt_handler.got_signal:
+            result = client.get_next()
+            on_receive(result)
+            ring_buffer.push_result(result[0][sensor_id])
+            if recorder is not None:
+                recorder.write(result)
+        print("Disconnecting...")
+        client.close()
+        close_live_view()
+        if recorder is not None:
+            recorder.close()
+        print(stats.summary())
+
+        print("Distance velocity results of first group")
+
+        # sensor config of 1st subsweep from second group is in session_config.groups[1][sensor_id]
+        print(f'Maximum Measureable Distance: {session_config.groups[0][sensor_id].prf.mmd}')
+        print(f'Maximum Unambiguous Range: {session_config.groups[0][sensor_id].prf.mur}')
+        print(session_config.groups[0][sensor_id])
+        if ring_buffer.dropped > 0:
+            print(f'only the last {len(ring_buffer)} of {ring_buffer.count} results are kept (RETENTION_FRAMES={RETENTION_FRAMES})')
+        # all retained frames are turned into distance velocity maps in batches of vectorized FFTs,
+        # and the figures are rendered by a pool of worker processes
+        with HeatmapRenderPool(workers=RENDER_WORKERS) as render_pool:
+            for first,distance_velocity_maps in engine.process_ring_buffer(ring_buffer):
+                render_pool.submit(first, distance_velocity_maps, x_axis_label, y_axis_label)
+        print(render_pool.summary())
+
+
+if __name__ == "__main__":
+    main()
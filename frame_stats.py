@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import time
+
+import numpy as np
+
+
+class AcquisitionStats:
+    # Lightweight per-frame instrumentation for a capture loop.
+    # record() stores tick, host receive time and the frame_delayed /
+    # data_saturated flags into preallocated arrays (the last `capacity`
+    # frames are kept), and a summary line is printed every
+    # `report_interval` seconds instead of once per frame.
+    #
+    # Jitter is the deviation of the host inter-frame interval from the
+    # configured frame period (or from the mean interval if no frame_rate is set).
+    # Dropped frames are estimated from gaps in the sensor ticks.
+    JITTER_BINS_MS = np.array([0.0, 0.5, 1, 2, 5, 10, 20, 50, np.inf])
+
+    def __init__(self, frame_rate: float | None = None, capacity: int = 4096, report_interval: float = 5.0) -> None:
+        self.frame_rate = frame_rate
+        self.capacity = capacity
+        self.report_interval = report_interval
+
+        self.ticks = np.zeros(capacity, dtype=np.int64)
+        self.receive_times = np.zeros(capacity)
+        self.frame_delayed = np.zeros(capacity, dtype=bool)
+        self.data_saturated = np.zeros(capacity, dtype=bool)
+
+        self.ticks_per_second = None
+        self.count = 0
+        self.num_delayed = 0
+        self.num_saturated = 0
+        self.start = None
+        self._last_report = None
+        self._last_report_count = 0
+
+    def record(self, result) -> None:
+        # result is an a121.Result or an extended result; flags are taken from
+        # every entry, tick from the first one
+        now = time.perf_counter()
+        if isinstance(result, list):
+            entries = [r for group in result for r in group.values()]
+        else:
+            entries = [result]
+
+        if self.ticks_per_second is None:
+            self.ticks_per_second = entries[0]._context.ticks_per_second
+
+        slot = self.count % self.capacity
+        self.ticks[slot] = entries[0].tick
+        self.receive_times[slot] = now
+        delayed = any(r.frame_delayed for r in entries)
+        saturated = any(r.data_saturated for r in entries)
+        self.frame_delayed[slot] = delayed
+        self.data_saturated[slot] = saturated
+        self.num_delayed += delayed
+        self.num_saturated += saturated
+        self.count += 1
+
+        if self.start is None:
+            self.start = self._last_report = now
+        elif self.report_interval > 0 and now - self._last_report >= self.report_interval:
+            print(self.summary(since_last_report=True))
+            self._last_report = now
+            self._last_report_count = self.count
+
+    def _slots(self, first: int):
+        # slots of absolute frames first..count-1 that are still stored, in order
+        first = max(first, self.count - self.capacity)
+        return np.arange(first, self.count) % self.capacity
+
+    def summary(self, since_last_report: bool = False) -> str:
+        first = self._last_report_count if since_last_report else 0
+        slots = self._slots(first)
+        if len(slots) < 2:
+            return f"{self.count} frames"
+
+        intervals = np.diff(self.receive_times[slots])
+        achieved_rate = 1.0 / intervals.mean()
+        expected_interval = 1.0 / self.frame_rate if self.frame_rate else intervals.mean()
+
+        tick_intervals = np.diff(self.ticks[slots]) / self.ticks_per_second
+        expected_tick_interval = 1.0 / self.frame_rate if self.frame_rate else np.median(tick_intervals)
+        if expected_tick_interval > 0:
+            dropped = int(np.sum(np.maximum(np.round(tick_intervals / expected_tick_interval) - 1, 0)))
+        else:
+            dropped = 0
+
+        jitter_ms = np.abs(intervals - expected_interval) * 1000
+        histogram, _ = np.histogram(jitter_ms, bins=self.JITTER_BINS_MS)
+
+        configured = f"{self.frame_rate:.1f}" if self.frame_rate else "max"
+        bins = " ".join(
+            f"<{edge:g}:{n}" for edge, n in zip(self.JITTER_BINS_MS[1:-1], histogram[:-1])
+        )
+        return (
+            f"{self.count} frames, {achieved_rate:.1f} Hz (configured {configured}), "
+            f"{np.count_nonzero(self.frame_delayed[slots])} delayed, ~{dropped} dropped, jitter ms p50 {np.percentile(jitter_ms, 50):.2f} "
+            f"max {jitter_ms.max():.2f} [{bins} >={self.JITTER_BINS_MS[-2]:g}:{histogram[-1]}], "
+            f"total delayed {self.num_delayed}, saturated {self.num_saturated}"
+        )
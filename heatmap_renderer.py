@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+class HeatmapRenderer:
+    # Range-doppler heatmap figure that is built once per session and reused.
+    # The axes extents never change within a session, so each frame only
+    # updates the image data, color limits and title before saving.
+    # Uses the Agg canvas directly, so it works from any thread or process
+    # without touching the pyplot backend.
+    def __init__(self, x_axis_label, y_axis_label, shape, directory='./range_velocity_map', label='Magnitude (dB)') -> None:
+        self.directory = directory
+        self.fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot()
+
+        self.image = ax.imshow(np.zeros(shape), aspect='auto', origin='lower', cmap='hot', interpolation='nearest',
+           extent=[x_axis_label[0], x_axis_label[-1], y_axis_label[0], y_axis_label[-1]])
+        self.fig.colorbar(self.image, ax=ax, label=label)
+        ax.set_xlabel('Range (m)')
+        ax.set_ylabel('Velocity (m/s)')
+        self.title = ax.set_title('range-doppler heatmap (results 0)')
+        self.fig.tight_layout()
+
+    def render(self, i, distance_velocity_map, path=None) -> None:
+        self.image.set_data(distance_velocity_map)
+        # same color scaling imshow picks for a new image
+        self.image.set_clim(np.min(distance_velocity_map), np.max(distance_velocity_map))
+        self.title.set_text(f'range-doppler heatmap (results {i})')
+        self.fig.savefig(path or f'{self.directory}/results{i}.png')
+
+
+def benchmark(num_frames=20, num_sweeps=10, num_points=100):
+    # compares render_pool.save_heatmap (new figure per frame) with HeatmapRenderer
+    import matplotlib.pyplot as plt
+
+    from render_pool import save_heatmap
+
+    plt.switch_backend('Agg')
+    rng = np.random.default_rng(0)
+    maps = rng.random((num_frames, num_sweeps, num_points))
+    x_axis_label = np.linspace(0.0, 0.75, num_points)
+    y_axis_label = np.linspace(-5.0, 5.0, num_sweeps)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for i, distance_velocity_map in enumerate(maps):
+            save_heatmap(i, distance_velocity_map, x_axis_label, y_axis_label, directory)
+        per_frame_time = (time.perf_counter() - start) / num_frames
+
+        start = time.perf_counter()
+        renderer = HeatmapRenderer(x_axis_label, y_axis_label, maps.shape[1:], directory)
+        for i, distance_velocity_map in enumerate(maps):
+            renderer.render(i, distance_velocity_map)
+        reused_time = (time.perf_counter() - start) / num_frames
+
+    print(f'{num_frames} frames of {num_sweeps} x {num_points}')
+    print(f'new figure per frame: {per_frame_time * 1000:8.1f} ms/frame')
+    print(f'HeatmapRenderer:      {reused_time * 1000:8.1f} ms/frame ({per_frame_time / reused_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare per-frame figures with HeatmapRenderer')
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--sweeps', type=int, default=10)
+    parser.add_argument('--points', type=int, default=100)
+    args = parser.parse_args()
+    benchmark(args.frames, args.sweeps, args.points)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+# (key of A121Visualizer.process_frame_data, panel title, line style), in 2x2 panel order
+PANELS = (
+    ('i_values', 'I values', 'r-'),
+    ('q_values', 'Q values', 'b-'),
+    ('magnitude', 'Magnitude', 'g-'),
+    ('phase', 'Phase (radian)', 'm-'),
+)
+
+# the two exports of A121Visualizer: one panel per sweep (x = distance point)
+# and one panel per distance point (x = sweep)
+EXPORTS = {
+    'distance': {
+        'x_label': 'distance point',
+        'title': 'distance point of sweep {n}',
+        'directory': './distance_point',
+        'png': 'distance_of_swip_{n}.png',
+        'pdf': 'distance_of_swip_frame{frame}.pdf',
+    },
+    'sweep': {
+        'x_label': 'sweep',
+        'title': 'sweep of distance point  {n}',
+        'directory': './sweep',
+        'png': 'sweep_of_distance_point_{n}.png',
+        'pdf': 'sweep_of_distance_point_frame{frame}.pdf',
+    },
+}
+
+
+def panel_values(processed_data, kind):
+    # (panels, 4, x) array: the four lines of every panel of one frame
+    values = np.stack([processed_data[key] for key, _, _ in PANELS], axis=1)
+    if kind == 'sweep':
+        values = values.transpose(2, 1, 0)
+    return values
+
+
+class LinePanelRenderer:
+    # The 2x2 I / Q / magnitude / phase figure of A121Visualizer.plot_distance_line
+    # and plot_sweep_line, built once and reused. Each panel only updates the
+    # y data of its four lines, rescales the axes and sets the title before
+    # saving, instead of creating and laying out a new figure.
+    def __init__(self, kind, num_x, dpi=300) -> None:
+        self.export = EXPORTS[kind]
+        self.dpi = dpi
+        self.fig = Figure(figsize=(15, 10))
+        FigureCanvasAgg(self.fig)
+        self.title = self.fig.suptitle('', fontsize=16)
+
+        x = np.arange(num_x)
+        self.axes = self.fig.subplots(2, 2).ravel()
+        self.lines = []
+        for ax, (_, title, style) in zip(self.axes, PANELS):
+            line, = ax.plot(x, np.zeros(num_x), style, linewidth=2, marker='o')
+            self.lines.append(line)
+            ax.set_title(title)
+            ax.set_xlabel(self.export['x_label'])
+            ax.set_ylabel('values')
+            ax.grid(True)
+        self._laid_out = False
+
+    def _update(self, n, values) -> None:
+        # values: (4, x), n: 1-based sweep or distance point number
+        for ax, line, y in zip(self.axes, self.lines, values):
+            line.set_ydata(y)
+            ax.relim()
+            ax.autoscale_view()
+        self.title.set_text(self.export['title'].format(n=n))
+        if not self._laid_out:
+            # the layout is computed once, with real data so the tick labels fit
+            self.fig.tight_layout()
+            self.fig.subplots_adjust(top=0.9)
+            self._laid_out = True
+
+    def render(self, first, values, directory=None) -> int:
+        # one PNG per panel, named like the A121Visualizer exports
+        directory = directory or self.export['directory']
+        for n, panel in enumerate(values, start=first + 1):
+            self._update(n, panel)
+            self.fig.savefig(os.path.join(directory, self.export['png'].format(n=n)), dpi=self.dpi)
+        return len(values)
+
+    def render_pdf(self, frame, values, directory=None) -> int:
+        # all panels of one frame as the pages of a single PDF
+        directory = directory or self.export['directory']
+        with PdfPages(os.path.join(directory, self.export['pdf'].format(frame=frame))) as pdf:
+            for n, panel in enumerate(values, start=1):
+                self._update(n, panel)
+                pdf.savefig(self.fig)
+        return len(values)
+
+
+# one reusable figure per (kind, x length) and process
+_renderers = {}
+
+
+def _get_renderer(kind, num_x, dpi):
+    key = (kind, num_x, dpi)
+    if key not in _renderers:
+        _renderers[key] = LinePanelRenderer(kind, num_x, dpi)
+    return _renderers[key]
+
+
+def _render_task(task):
+    kind, output, frame, first, values, directory, dpi = task
+    renderer = _get_renderer(kind, values.shape[-1], dpi)
+    if output == 'pdf':
+        return renderer.render_pdf(frame, values, directory)
+    return renderer.render(first, values, directory)
+
+
+class LinePanelExporter:
+    # Batch export of the A121Visualizer line panels.
+    #
+    # output='png' writes one PNG per panel (same names as plot_distance_line /
+    # plot_sweep_line), split into chunks of `chunk_size` panels rendered by
+    # worker processes. output='pdf' writes one multi-page PDF per frame and
+    # export, each rendered by one worker. workers=None uses all cores,
+    # workers=0 renders in this process.
+    #
+    # Scripts using this must guard their entry point with
+    # `if __name__ == "__main__":`, see render_pool.HeatmapRenderPool.
+    def __init__(self, output='png', workers: int | None = 0, chunk_size: int = 16, dpi=300, directories=None) -> None:
+        if output not in ('png', 'pdf'):
+            raise ValueError(f"unknown output {output!r}, expected 'png' or 'pdf'")
+        self.output = output
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.dpi = dpi
+        self.directories = directories or {}
+        self.pool = mp.Pool(self.workers) if self.workers > 0 else None
+        self.pending = []
+        self.num_panels = 0
+        self.start = None
+        self.elapsed = 0.0
+
+    def submit(self, frame, processed_data, kinds=('distance', 'sweep')) -> None:
+        if self.start is None:
+            self.start = time.perf_counter()
+        for kind in kinds:
+            values = panel_values(processed_data, kind)
+            directory = self.directories.get(kind)
+            chunk_size = len(values) if self.output == 'pdf' else self.chunk_size
+            for first in range(0, len(values), chunk_size):
+                task = (kind, self.output, frame, first, values[first : first + chunk_size], directory, self.dpi)
+                if self.pool is None:
+                    self.num_panels += _render_task(task)
+                else:
+                    self.pending.append(self.pool.apply_async(_render_task, (task,)))
+
+    def close(self) -> None:
+        # waits for all submitted panels to be written
+        if self.pool is not None:
+            self.pool.close()
+            for pending in self.pending:
+                self.num_panels += pending.get()
+            self.pool.join()
+            self.pending = []
+        if self.start is not None:
+            self.elapsed = time.perf_counter() - self.start
+
+    def __enter__(self) -> LinePanelExporter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None and self.pool is not None:
+            self.pool.terminate()
+            return
+        self.close()
+
+    def summary(self) -> str:
+        rate = self.num_panels / self.elapsed if self.elapsed > 0 else 0.0
+        return f'{self.num_panels} panels ({self.output}) in {self.elapsed:.2f} s with {self.workers} workers ({rate:.1f} panels/s)'
+
+
+def benchmark(num_frames=1, num_sweeps=10, num_points=15, workers=None, dpi=300):
+    # compares the A121Visualizer loops (new figure per panel) with LinePanelExporter
+    import matplotlib.pyplot as plt
+
+    from plot_analog2 import A121Visualizer
+
+    plt.switch_backend('Agg')
+    rng = np.random.default_rng(0)
+    frames = rng.integers(-2000, 2000, (num_frames, num_sweeps, num_points)) + 1j * rng.integers(
+        -2000, 2000, (num_frames, num_sweeps, num_points)
+    )
+    visualizer = A121Visualizer(num_points=num_points, sweeps_per_frame=num_sweeps)
+    processed = [visualizer.process_frame_data(frame) for frame in frames]
+    num_panels = num_frames * (num_sweeps + num_points)
+
+    timings = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'distance_point'))
+        os.makedirs(os.path.join(directory, 'sweep'))
+        os.chdir(directory)
+        try:
+            start = time.perf_counter()
+            for processed_data in processed:
+                visualizer.plot_distance_line(processed_data)
+                visualizer.plot_sweep_line(processed_data)
+            timings.append(('A121Visualizer loops', time.perf_counter() - start))
+
+            for label, output, num_workers in (
+                ('exporter png, serial', 'png', 0),
+                (f'exporter png, {workers or os.cpu_count()} workers', 'png', workers),
+                ('exporter pdf, serial', 'pdf', 0),
+            ):
+                with LinePanelExporter(output, workers=num_workers, dpi=dpi) as exporter:
+                    for frame, processed_data in enumerate(processed):
+                        exporter.submit(frame, processed_data)
+                timings.append((label, exporter.elapsed))
+        finally:
+            os.chdir(cwd)
+
+    print(f'{num_frames} frames of {num_sweeps} sweeps x {num_points} points = {num_panels} panels at dpi {dpi}')
+    baseline = timings[0][1]
+    for label, elapsed in timings:
+        print(f'{label:28s} {elapsed / num_panels * 1000:8.1f} ms/panel ({baseline / elapsed:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare A121Visualizer plotting with LinePanelExporter')
+    parser.add_argument('--frames', type=int, default=1)
+    parser.add_argument('--sweeps', type=int, default=10)
+    parser.add_argument('--points', type=int, default=15)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dpi', type=int, default=300)
+    args = parser.parse_args()
+    benchmark(args.frames, args.sweeps, args.points, args.workers, args.dpi)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import numpy as np
+
+import acconeer.exptool as et
+from acconeer.exptool import a121
+
+from display_link import DisplayLink
+from frame_stats import AcquisitionStats
+from plot import MultiPGUpdater
+from profiles import load_profile
+from range_doppler import RangeDopplerEngine
+from replay_client import open_client
+from session_axes import SessionAxes
+from shm_transport import SharedFrameSender, SharedFrameUpdater
+
+# session profile (name in profiles/ or path to a .toml/.json file, see profiles.py)
+PROFILE = "range_doppler"
+
+# The heatmap is redrawn at most MAX_FREQ times per second; at lower frame rates
+# every frame is shown, at higher ones the latest frame at each redraw
+MAX_FREQ = 60.0
+
+# maps are shown in dB, the color scale spanning DYNAMIC_RANGE_DB below the (smoothed) peak
+DB = True
+DYNAMIC_RANGE_DB = 40.0
+
+
+class RangeDopplerPGUpdater:
+    # Live distance-velocity map of one subsweep in a single ImageItem.
+    # Axes, image rectangle and buffers are set up once from the session config;
+    # update() computes the map from the raw frame with RangeDopplerEngine into
+    # the same buffer and only replaces the image data and color levels.
+    # Same interface as plot.PGUpdater, so it can be used with MultiPGUpdater.
+    def __init__(
+        self,
+        session_config: a121.SessionConfig,
+        extended_metadata: list[dict[int, a121.Metadata]],
+        group_idx: int = 0,
+        sensor_id: int | None = None,
+        subsweep_idx: int = 0,
+        db: bool = DB,
+        name: str | None = None,
+    ) -> None:
+        self.session_config = session_config
+        self.extended_metadata = extended_metadata
+        self.group_idx = group_idx
+        self.sensor_id = sensor_id if sensor_id is not None else next(iter(session_config.groups[group_idx]))
+        self.subsweep_idx = subsweep_idx
+        self.db = db
+        self.name = name
+
+    def setup(self, win):
+        import pyqtgraph as pg
+
+        sensor_config = self.session_config.groups[self.group_idx][self.sensor_id]
+        metadata = self.extended_metadata[self.group_idx][self.sensor_id]
+        offset = metadata.subsweep_data_offset[self.subsweep_idx]
+        self.columns = slice(offset, offset + metadata.subsweep_data_length[self.subsweep_idx])
+        self.engine = RangeDopplerEngine(sensor_config.sweeps_per_frame)
+        self.map = np.zeros((sensor_config.sweeps_per_frame, self.columns.stop - self.columns.start), dtype=np.float32)
+
+        title = f"Range-Doppler / Group {self.group_idx} / Sensor {self.sensor_id}"
+        if self.name is not None:
+            title = f"{self.name} / {title}"
+        plot = win.addPlot(title=title)
+        plot.setMenuEnabled(False)
+        plot.setMouseEnabled(x=False, y=False)
+        plot.hideButtons()
+        plot.setLabel("bottom", "Range (m)")
+        plot.setLabel("left", "Velocity (m/s)")
+        for axis in ("bottom", "left"):
+            plot.getAxis(axis).enableAutoSIPrefix(False)
+
+        # pixel centers on the distance points and velocity bins
+        session_axes = SessionAxes(self.session_config, self.extended_metadata)
+        distances = session_axes.distances(self.group_idx, self.sensor_id, self.subsweep_idx)
+        velocities = session_axes.velocities(self.group_idx, self.sensor_id)
+        dx = distances[1] - distances[0] if len(distances) > 1 else 1e-3
+        dv = velocities[1] - velocities[0] if len(velocities) > 1 else 1e-3
+        self.image = pg.ImageItem(self.map, axisOrder="row-major")
+        self.image.setRect(
+            distances[0] - dx / 2, velocities[0] - dv / 2, len(distances) * dx, len(velocities) * dv
+        )
+        plot.addItem(self.image)
+        plot.setRange(
+            xRange=(distances[0] - dx / 2, distances[-1] + dx / 2),
+            yRange=(velocities[0] - dv / 2, velocities[-1] + dv / 2),
+            padding=0,
+        )
+
+        self.color_bar = pg.ColorBarItem(
+            colorMap=pg.colormap.get("inferno"),
+            interactive=False,
+            label="Magnitude (dB)" if self.db else "Magnitude",
+        )
+        self.color_bar.setImageItem(self.image, insert_in=plot)
+        self.smooth_max = et.utils.SmoothMax(self.session_config.update_rate)
+
+    def update(self, extended_result: list[dict[int, a121.Result]]) -> None:
+        result = extended_result[self.group_idx][self.sensor_id]
+        self.engine.process(result._frame[:, self.columns], db=self.db, out=self.map)
+        high = self.smooth_max.update(float(np.max(self.map)))
+        low = high - DYNAMIC_RANGE_DB if self.db else 0.0
+        self.image.setImage(self.map, autoLevels=False)
+        self.color_bar.setLevels((low, high))
+
+
+class LiveRangeDopplerView:
+    # A RangeDopplerPGUpdater in its own plot process (et.PGProcess). Raw frames
+    # go there through shared memory and the maps are computed there, so the
+    # acquisition loop only pays for put(). Like plot.py, only the latest result
+    # is sent once the previous one has been drawn (see display_link.py).
+    def __init__(
+        self,
+        session_config: a121.SessionConfig,
+        extended_metadata: list[dict[int, a121.Metadata]],
+        ticks_per_second: int,
+        max_freq: float = MAX_FREQ,
+        report_interval: float = 0,
+        **kwargs,
+    ) -> None:
+        self.sender = SharedFrameSender(session_config, extended_metadata, ticks_per_second)
+        self.display_link = DisplayLink(
+            SharedFrameUpdater(
+                MultiPGUpdater([RangeDopplerPGUpdater(session_config, extended_metadata, **kwargs)]),
+                [self.sender.receiver],
+            ),
+            max_freq=max_freq,
+            report_interval=report_interval,
+            encode=lambda _, extended_result: self.sender.send(extended_result),
+        )
+
+    def start(self) -> None:
+        self.display_link.start()
+
+    def put(self, extended_result) -> None:
+        # raises et.PGProccessDiedException once the window has been closed
+        self.display_link.put(0, extended_result)
+
+    def close(self) -> None:
+        self.display_link.close()
+        self.sender.close()
+
+    def summary(self) -> str:
+        return self.display_link.summary()
+
+
+def main(profile=PROFILE):
+    parser = a121.ExampleArgumentParser()
+    parser.add_argument("--profile", default=profile, help="session profile name or file (default: %(default)s)")
+    parser.add_argument("--group", type=int, default=0, help="group of the sensor to show")
+    parser.add_argument("--subsweep", type=int, default=0, help="subsweep to show")
+    args = parser.parse_args()
+    et.utils.config_logging(args)
+
+    # loaded before the client is opened, so an invalid profile fails before the sensor is connected
+    profile = load_profile(args.profile)
+    session_config = profile.session_config
+
+    client = open_client(
+        # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+        # or
+        # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+        # or
+        # usb_device=True,
+        # or
+        # mock=True,
+        serial_port='COM4',
+        override_baudrate=115200
+    )
+    extended_metadata = profile.setup_session(client)
+    sensor_id = next(iter(session_config.groups[args.group]))
+    sensor_config = session_config.groups[args.group][sensor_id]
+
+    view = LiveRangeDopplerView(
+        session_config,
+        extended_metadata,
+        client.server_info.ticks_per_second,
+        report_interval=5.0,
+        group_idx=args.group,
+        subsweep_idx=args.subsweep,
+    )
+    view.start()
+    stats = AcquisitionStats(sensor_config.frame_rate, report_interval=5.0)
+    client.start_session()
+
+    interrupt_handler = et.utils.ExampleInterruptHandler()
+    print("Press Ctrl-C to end session")
+
+    try:
+        while not interrupt_handler.got_signal:
+            result = client.get_next()
+            stats.record(result)
+            view.put(result)
+    except et.PGProccessDiedException:
+        pass
+    finally:
+        print("Disconnecting...")
+        view.close()
+        client.close()
+        print(stats.summary())
+        print(view.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import numpy.typing as npt
+
+# File layout:
+#   8 bytes   magic b"XM125MAP"
+#   4 bytes   format version (little endian uint32)
+#   4 bytes   data offset in bytes (little endian uint32)
+#   JSON header (utf-8), padded with spaces up to the data offset
+#   chunks, appended until the file is closed
+#
+# The header lists the stored maps by key ("g{group}_s{sensor}_sub{subsweep}")
+# with their shape, dtype and axes, and whether the maps are in dB or linear. A chunk holds up to CHUNK_FRAMES
+# consecutive maps of one key:
+#   _CHUNK header (key index, number of maps, compressed size)
+#   the ticks of its maps (int64, uncompressed)
+#   the maps, byte-shuffled and zlib-compressed
+# so the frame index (ticks and chunk offsets) is built by reading only the
+# chunk headers and ticks, and a single map is read by decompressing one chunk.
+# Like recordings, a store cut short is readable up to its last full chunk.
+MAGIC = b"XM125MAP"
+VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_CHUNK = struct.Struct("<III")
+_DATA_ALIGNMENT = 64
+
+# maps per chunk: larger chunks compress slightly better, smaller ones make
+# reading a single map cheaper (and lose less when a capture is cut short)
+CHUNK_FRAMES = 16
+COMPRESSION_LEVEL = 1
+
+# decompressed chunks kept by MapStore for random access
+CACHED_CHUNKS = 8
+
+
+def map_key(group_idx: int, sensor_id: int, subsweep_idx: int) -> str:
+    return f"g{group_idx}_s{sensor_id}_sub{subsweep_idx}"
+
+
+def _shuffle(maps: np.ndarray) -> bytes:
+    # byte i of every value together (like the HDF5 shuffle filter): the
+    # exponent bytes of float maps are alike and compress far better this way
+    return np.ascontiguousarray(maps.reshape(-1).view(np.uint8).reshape(-1, maps.dtype.itemsize).T).tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype, shape) -> np.ndarray:
+    return np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+
+
+class MapWriter:
+    # Writes distance-velocity maps into a map store file. The maps of each key
+    # are collected in a buffer of CHUNK_FRAMES and compressed into a chunk
+    # when it is full, so append() only copies one map.
+    #
+    # maps: {key: (distances, velocities)} the axes of each stored map; the
+    # map shape is (len(velocities), len(distances)) and the axes are kept in
+    # the header, so maps can be rendered without the session. db tells whether
+    # the maps are 20*log10 magnitudes or linear ones (see RangeDopplerEngine.process).
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        maps: dict[str, tuple[npt.ArrayLike, npt.ArrayLike]],
+        db: bool,
+        dtype: npt.DTypeLike = np.float32,
+        chunk_frames: int = CHUNK_FRAMES,
+        attributes: dict | None = None,
+    ) -> None:
+        self.dtype = np.dtype(dtype)
+        self.db = db
+        self.chunk_frames = chunk_frames
+        self.keys = list(maps)
+        self.num_maps = dict.fromkeys(self.keys, 0)
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+        header = {
+            "dtype": self.dtype.str,
+            "db": db,
+            "maps": {
+                key: {
+                    "shape": [len(velocities), len(distances)],
+                    "distances": [float(d) for d in distances],
+                    "velocities": [float(v) for v in velocities],
+                }
+                for key, (distances, velocities) in maps.items()
+            },
+            # anything else worth keeping with the maps, e.g. the session config
+            "attributes": attributes or {},
+        }
+        self._buffers = {
+            key: np.empty((chunk_frames, *header["maps"][key]["shape"]), dtype=self.dtype) for key in self.keys
+        }
+        self._ticks = {key: np.empty(chunk_frames, dtype="<i8") for key in self.keys}
+        self._fill = dict.fromkeys(self.keys, 0)
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_offset = -(-(_PREAMBLE.size + len(header_bytes)) // _DATA_ALIGNMENT) * _DATA_ALIGNMENT
+        self._file = open(path, "wb")
+        self._file.write(_PREAMBLE.pack(MAGIC, VERSION, data_offset))
+        self._file.write(header_bytes.ljust(data_offset - _PREAMBLE.size))
+
+    def append(self, key: str, tick: int, distance_velocity_map: npt.ArrayLike) -> None:
+        fill = self._fill[key]
+        self._buffers[key][fill] = distance_velocity_map
+        self._ticks[key][fill] = tick
+        self._fill[key] = fill + 1
+        self.num_maps[key] += 1
+        if fill + 1 == self.chunk_frames:
+            self._write_chunk(key)
+
+    def _write_chunk(self, key: str) -> None:
+        fill = self._fill[key]
+        if fill == 0:
+            return
+        maps = self._buffers[key][:fill]
+        data = zlib.compress(_shuffle(maps), COMPRESSION_LEVEL)
+        self._file.write(_CHUNK.pack(self.keys.index(key), fill, len(data)))
+        self._file.write(self._ticks[key][:fill].tobytes())
+        self._file.write(data)
+        self.raw_bytes += maps.nbytes
+        self.compressed_bytes += len(data)
+        self._fill[key] = 0
+
+    def flush(self) -> None:
+        # writes the partly filled chunks, e.g. before reading a store that is still being written
+        for key in self.keys:
+            self._write_chunk(key)
+        self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+    def summary(self) -> str:
+        ratio = self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+        counts = ", ".join(f"{key}: {count}" for key, count in self.num_maps.items())
+        return f"{counts} maps, {self.raw_bytes / 1e6:.1f} MB compressed to {self.compressed_bytes / 1e6:.1f} MB ({ratio:.1f}x)"
+
+    def __enter__(self) -> MapWriter:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class MapStore:
+    # Read-only view of a map store file. Opening it reads the header and the
+    # chunk index; maps are decompressed on access, a chunk at a time, and the
+    # last CACHED_CHUNKS chunks are kept.
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, data_offset = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a map store (bad magic {magic!r})")
+        if version != VERSION:
+            raise ValueError(f"{path} has unsupported format version {version}")
+        header = json.loads(self._file.read(data_offset - _PREAMBLE.size))
+
+        self.dtype = np.dtype(header["dtype"])
+        # stores written before the field existed all came from sparse_iq_copy.py, which stores linear maps
+        self.db = header.get("db", False)
+        self.attributes = header["attributes"]
+        self._maps = header["maps"]
+        self.keys = list(self._maps)
+
+        # per key: (offset of the compressed maps, compressed size, number of maps) of each chunk
+        chunks = {key: [] for key in self.keys}
+        ticks = {key: [] for key in self.keys}
+        size = os.path.getsize(path)
+        offset = data_offset
+        while offset + _CHUNK.size <= size:
+            key_idx, num_maps, length = _CHUNK.unpack(self._file.read(_CHUNK.size))
+            data_offset = offset + _CHUNK.size + 8 * num_maps
+            if data_offset + length > size:
+                # cut short while the chunk was written
+                break
+            key = self.keys[key_idx]
+            ticks[key].append(np.frombuffer(self._file.read(8 * num_maps), dtype="<i8"))
+            chunks[key].append((data_offset, length, num_maps))
+            offset = data_offset + length
+            self._file.seek(offset)
+
+        self._chunks = chunks
+        self._ticks = {key: np.concatenate(ticks[key]) if ticks[key] else np.zeros(0, "<i8") for key in self.keys}
+        # index of the first map of each chunk (and the total), to find the chunk of a map
+        self._starts = {key: np.cumsum([0] + [num_maps for _, _, num_maps in chunks[key]]) for key in self.keys}
+        self._chunk = functools.lru_cache(maxsize=CACHED_CHUNKS)(self._read_chunk)
+
+    def __len__(self) -> int:
+        # maps of the first key
+        return self.num_maps(self.keys[0]) if self.keys else 0
+
+    def num_maps(self, key: str) -> int:
+        return len(self._ticks[key])
+
+    def shape(self, key: str) -> tuple[int, int]:
+        return tuple(self._maps[key]["shape"])
+
+    def distances(self, key: str) -> npt.NDArray[np.float64]:
+        return np.array(self._maps[key]["distances"])
+
+    def velocities(self, key: str) -> npt.NDArray[np.float64]:
+        return np.array(self._maps[key]["velocities"])
+
+    def ticks(self, key: str) -> npt.NDArray[np.int64]:
+        return self._ticks[key]
+
+    def index(self, key: str, tick: int) -> int:
+        # index of the map with this tick, or the last one before it
+        ticks = self._ticks[key]
+        i = int(np.searchsorted(ticks, tick, side="right")) - 1
+        if i < 0:
+            raise KeyError(f"no {key} map at or before tick {tick} (first tick {ticks[0] if len(ticks) else None})")
+        return i
+
+    def _read_chunk(self, key: str, chunk_idx: int) -> np.ndarray:
+        offset, length, num_maps = self._chunks[key][chunk_idx]
+        self._file.seek(offset)
+        data = zlib.decompress(self._file.read(length))
+        maps = _unshuffle(data, self.dtype, (num_maps, *self.shape(key)))
+        maps.flags.writeable = False
+        return maps
+
+    def map(self, key: str, index: int) -> npt.NDArray:
+        # the index-th map of key (read-only; copy before modifying)
+        if index < 0:
+            index += self.num_maps(key)
+        if not 0 <= index < self.num_maps(key):
+            raise IndexError(f"{key} has {self.num_maps(key)} maps, no map {index}")
+        chunk_idx = int(np.searchsorted(self._starts[key], index, side="right")) - 1
+        return self._chunk(key, chunk_idx)[index - self._starts[key][chunk_idx]]
+
+    def map_at(self, key: str, tick: int) -> npt.NDArray:
+        return self.map(key, self.index(key, tick))
+
+    def maps(self, key: str, start: int = 0, stop: int | None = None) -> npt.NDArray:
+        # (maps, velocities, distances) for maps[start:stop], read chunk by chunk
+        start, stop, _ = slice(start, stop).indices(self.num_maps(key))
+        starts = self._starts[key]
+        out = np.empty((max(0, stop - start), *self.shape(key)), dtype=self.dtype)
+        first = int(np.searchsorted(starts, start, side="right")) - 1
+        for chunk_idx in range(max(first, 0), len(starts) - 1):
+            if starts[chunk_idx] >= stop:
+                break
+            lo, hi = max(start, starts[chunk_idx]), min(stop, starts[chunk_idx + 1])
+            out[lo - start : hi - start] = self._chunk(key, chunk_idx)[lo - starts[chunk_idx] : hi - starts[chunk_idx]]
+        return out
+
+    def renderer(self, key: str, directory: str = "./range_velocity_map"):
+        # a HeatmapRenderer for the maps of key
+        from heatmap_renderer import HeatmapRenderer
+
+        return HeatmapRenderer(
+            self.distances(key), self.velocities(key), self.shape(key), directory, label=self.label
+        )
+
+    @property
+    def label(self) -> str:
+        # colorbar label for the unit of the stored maps
+        return "Magnitude (dB)" if self.db else "Magnitude"
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> MapStore:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def benchmark(num_frames=1000, num_sweeps=10, num_points=100):
+    # writes dB maps like the ones of sparse_iq_copy.py into a store, compared
+    # with saving them as PNGs, then reads them back in order and at random
+    from heatmap_renderer import HeatmapRenderer
+    from range_doppler import RangeDopplerEngine
+
+    rng = np.random.default_rng(0)
+    frames = rng.normal(size=(num_frames, num_sweeps, num_points)) + 1j * rng.normal(size=(num_frames, num_sweeps, num_points))
+    maps = RangeDopplerEngine(num_sweeps).process(frames * 100, db=True).astype(np.float32)
+    distances = np.linspace(0.2, 0.45, num_points)
+    velocities = np.linspace(-1.0, 1.0, num_sweeps)
+    key = map_key(0, 1, 0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "maps.xmm")
+        start = time.perf_counter()
+        with MapWriter(path, {key: (distances, velocities)}, db=True) as writer:
+            for i, distance_velocity_map in enumerate(maps):
+                writer.append(key, 10 * i, distance_velocity_map)
+        write_time = (time.perf_counter() - start) / num_frames
+        print(f"{num_frames} maps of {num_sweeps} x {num_points}: {writer.summary()}")
+
+        num_png = min(num_frames, 20)
+        renderer = HeatmapRenderer(distances, velocities, maps.shape[1:], directory)
+        start = time.perf_counter()
+        for i in range(num_png):
+            renderer.render(i, maps[i])
+        png_time = (time.perf_counter() - start) / num_png
+        png_size = os.path.getsize(os.path.join(directory, "results0.png"))
+
+        with MapStore(path) as store:
+            start = time.perf_counter()
+            stored = store.maps(key)
+            read_time = (time.perf_counter() - start) / num_frames
+            indices = rng.integers(0, num_frames, 1000)
+            start = time.perf_counter()
+            for i in indices:
+                store.map_at(key, 10 * i)
+            random_time = (time.perf_counter() - start) / len(indices)
+            assert np.array_equal(stored, maps)
+
+    print(f"PNG per map:        {png_time * 1e6:10.1f} us/map, {png_size:8d} bytes/map")
+    print(f"store write:        {write_time * 1e6:10.1f} us/map, {writer.compressed_bytes / num_frames:8.0f} bytes/map")
+    print(f"store read:         {read_time * 1e6:10.1f} us/map")
+    print(f"store random read:  {random_time * 1e6:10.1f} us/map (by tick)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="summarize a map store, render maps from it, or run the benchmark")
+    parser.add_argument("path", nargs="?", help="map store file (without it: benchmark)")
+    parser.add_argument("--key", help="maps to render (default: the first key)")
+    parser.add_argument("--tick", type=int, action="append", help="render the map at this tick (may be repeated)")
+    parser.add_argument("--index", type=int, action="append", help="render the index-th map (may be repeated)")
+    parser.add_argument("--all", action="store_true", help="render every map")
+    parser.add_argument("--out", default="./range_velocity_map", help="directory for the rendered PNGs")
+    parser.add_argument("--frames", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.path is None:
+        benchmark(args.frames)
+        raise SystemExit
+
+    with MapStore(args.path) as store:
+        for key in store.keys:
+            ticks = store.ticks(key)
+            tick_range = f", ticks {ticks[0]}..{ticks[-1]}" if len(ticks) else ""
+            print(f"{key}: {store.num_maps(key)} maps of {store.shape(key)} ({'dB' if store.db else 'linear'}){tick_range}")
+
+        key = args.key or store.keys[0]
+        indices = [store.index(key, tick) for tick in args.tick or []] + [
+            i % store.num_maps(key) for i in args.index or []
+        ]
+        if args.all:
+            indices = range(store.num_maps(key))
+        if indices:
+            os.makedirs(args.out, exist_ok=True)
+            renderer = store.renderer(key, args.out)
+            for i in indices:
+                renderer.render(i, store.map(key, i))
+            print(f"rendered {len(indices)} maps of {key} into {args.out}")
@@ -3,81 +3,127 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+
 import numpy as np
 
 import acconeer.exptool as et
 from acconeer.exptool import a121
 
-
-def main():
-    args = a121.ExampleArgumentParser().parse_args()
+from async_client import AsyncClient, merge_by_tick
+from display_link import DisplayLink
+from recording import to_complex
+from session_axes import SessionAxes
+from shm_transport import SharedFrameSender, SharedFrameUpdater
+from profiles import load_profile
+
+
+# One entry per XM125 module, each shown in its own row of plots:
+#     ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+#     or
+#     serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+#     or
+#     usb_device=True,
+#     or
+#     mock=True,
+CLIENTS = [
+    dict(serial_port='COM4', override_baudrate=115200),
+]
+
+# session profile (name in profiles/ or path to a .toml/.json file, see profiles.py)
+PROFILE = "plot"
+
+# The window is redrawn at most UI_RATE times per second. Only the latest result of every
+# client is sent to the plot process once it has drawn the previous one (see display_link.py)
+UI_RATE = 30.0
+
+# amplitudes are averaged over about this many plot updates (exponential moving average),
+# None = show the latest frame only
+AVERAGING_FRAMES = None
+
+def main(profile=PROFILE):
+    parser = a121.ExampleArgumentParser()
+    parser.add_argument("--profile", default=profile, help="session profile name or file (default: %(default)s)")
+    args = parser.parse_args()
     et.utils.config_logging(args)
 
-    client = a121.Client.open(
-    # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
-    # or
-    # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
-    # or
-    # usb_device=True,
-    # or
-    # mock=True,
-    serial_port='COM4',
-    override_baudrate=115200
-)
-
-    session_config = a121.SessionConfig(
-        [
-            {
-                1: a121.SensorConfig(
-                    subsweeps=[
-                        a121.SubsweepConfig(
-                            start_point=25,
-                            step_length=2,
-                            num_points=30,
-                            profile=a121.Profile.PROFILE_1,
-                            hwaas=10,
-                        ),
-                        a121.SubsweepConfig(
-                            start_point=75,
-                            step_length=4,
-                            num_points=25,
-                            profile=a121.Profile.PROFILE_3,
-                            hwaas=20,
-                        ),
-                    ],
-                )
-            },
-            {
-                1: a121.SensorConfig(
-                    receiver_gain=20,
-                ),
-            },
-        ],
-        extended=True,
-    )
+    profile = load_profile(args.profile)
 
-    extended_metadata = client.setup_session(session_config)
+    asyncio.run(run(profile))
 
-    pg_updater = PGUpdater(session_config, extended_metadata)
-    pg_process = et.PGProcess(pg_updater)
-    pg_process.start()
 
-    client.start_session()
+async def run(profile):
+    session_config = profile.session_config
+    clients = await asyncio.gather(
+        *(AsyncClient.open(name=f"Client {i}", **kwargs) for i, kwargs in enumerate(CLIENTS))
+    )
+    client_indices = {client.name: i for i, client in enumerate(clients)}
+    all_extended_metadata = await asyncio.gather(*(client.setup_session(session_config) for client in clients))
+    profile.store_metadata(clients[0].server_info, all_extended_metadata[0])
+
+    pg_updater = MultiPGUpdater(
+        [
+            PGUpdater(
+                session_config,
+                extended_metadata,
+                name=client.name if len(clients) > 1 else None,
+                averaging_frames=AVERAGING_FRAMES,
+            )
+            for client, extended_metadata in zip(clients, all_extended_metadata)
+        ]
+    )
+    # frames go to the plot process through shared memory, only sequence numbers are pickled
+    senders = [
+        SharedFrameSender(session_config, extended_metadata, client.server_info.ticks_per_second)
+        for client, extended_metadata in zip(clients, all_extended_metadata)
+    ]
+    display_link = DisplayLink(
+        SharedFrameUpdater(pg_updater, [sender.receiver for sender in senders]),
+        max_freq=UI_RATE,
+        report_interval=5.0,
+        encode=lambda client_idx, extended_result: senders[client_idx].send(extended_result),
+    )
+    display_link.start()
+
+    await asyncio.gather(*(client.start_session() for client in clients))
 
     interrupt_handler = et.utils.ExampleInterruptHandler()
     print("Press Ctrl-C to end session")
 
-    while not interrupt_handler.got_signal:
-        extended_result = client.get_next()
+    try:
+        # closed before the clients, so its readers are no longer calling get_next()
+        async with contextlib.aclosing(merge_by_tick(clients)) as merged:
+            async for client, extended_result in merged:
+                if interrupt_handler.got_signal:
+                    break
+                try:
+                    display_link.put(client_indices[client.name], extended_result)
+                except et.PGProccessDiedException:
+                    break
+    finally:
+        print("Disconnecting...")
+        display_link.close()
+        for sender in senders:
+            sender.close()
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+        print(display_link.summary())
+
+
+class MultiPGUpdater:
+    # One PGUpdater per client, stacked in rows. update() takes
+    # {client index: extended result} and only redraws the clients present.
+    def __init__(self, updaters: list[PGUpdater]) -> None:
+        self.updaters = updaters
 
-        try:
-            pg_process.put_data(extended_result)
-        except et.PGProccessDiedException:
-            break
+    def setup(self, win):
+        for updater in self.updaters:
+            updater.setup(win)
+            win.nextRow()
 
-    print("Disconnecting...")
-    pg_process.close()
-    client.close()
+    def update(self, latest: dict[int, list[dict[int, a121.Result]]]) -> None:
+        for client_idx, extended_result in latest.items():
+            self.updaters[client_idx].update(extended_result)
 
 
 class PGUpdater:
@@ -85,22 +131,36 @@ class PGUpdater:
         self,
         session_config: a121.SessionConfig,
         extended_metadata: list[dict[int, a121.Metadata]],
+        name: str | None = None,
+        averaging_frames: float | None = None,
     ) -> None:
         self.session_config = session_config
         self.extended_metadata = extended_metadata
+        # prefixed to the plot titles, to tell clients apart
+        self.name = name
+        # if set, the amplitude curves are an exponential moving average with a
+        # time constant of this many updates instead of the latest frame only
+        self.averaging_frames = averaging_frames
 
     def setup(self, win):
+        self.session_axes = SessionAxes(self.session_config, self.extended_metadata)
         self.all_plots = []
         self.all_curves = []
         self.all_smooth_maxs = []
+        # per subsweep: (frame columns, complex64 subframe, |subframe|, mean over sweeps,
+        # moving average or None)
+        self.all_buffers = []
 
         for group_idx, group in enumerate(self.session_config.groups):
             group_plots = {}
             group_curves = {}
             group_smooth_maxs = {}
+            group_buffers = {}
 
             for sensor_id, sensor_config in group.items():
                 title = f"Group {group_idx} / Sensor {sensor_id}"
+                if self.name is not None:
+                    title = f"{self.name} / {title}"
                 plot = win.addPlot(title=title)
                 plot.setMenuEnabled(False)
                 plot.setMouseEnabled(x=False, y=False)
@@ -117,6 +177,19 @@ class PGUpdater:
 
                 group_plots[sensor_id] = plot
                 group_curves[sensor_id] = curves
+                # the subframe is converted into complex64 (instead of complex128 by
+                # result.subframes) and the amplitudes are float32
+                metadata = self.extended_metadata[group_idx][sensor_id]
+                group_buffers[sensor_id] = [
+                    (
+                        slice(offset, offset + length),
+                        np.empty((sensor_config.sweeps_per_frame, length), dtype=np.complex64),
+                        np.empty((sensor_config.sweeps_per_frame, length), dtype=np.float32),
+                        np.empty(length, dtype=np.float32),
+                        np.zeros(length, dtype=np.float32) if self.averaging_frames else None,
+                    )
+                    for offset, length in zip(metadata.subsweep_data_offset, metadata.subsweep_data_length)
+                ]
 
                 smooth_max = et.utils.SmoothMax(self.session_config.update_rate)
                 group_smooth_maxs[sensor_id] = smooth_max
@@ -124,31 +197,40 @@ class PGUpdater:
             self.all_plots.append(group_plots)
             self.all_curves.append(group_curves)
             self.all_smooth_maxs.append(group_smooth_maxs)
+            self.all_buffers.append(group_buffers)
+
+        self.num_updates = 0
 
     def update(self, extended_result: list[dict[int, a121.Result]]) -> None:
         for group_idx, group in enumerate(extended_result):
             for sensor_id, result in group.items():
                 plot = self.all_plots[group_idx][sensor_id]
                 curves = self.all_curves[group_idx][sensor_id]
+                buffers = self.all_buffers[group_idx][sensor_id]
 
                 max_ = 0
 
-                for sub_idx, subframe in enumerate(result.subframes):
-                    x = get_distances_m(
-                        self.session_config.groups[group_idx][sensor_id].subsweeps[sub_idx]
-                    )
-                    y = np.abs(subframe).mean(axis=0)
+                for sub_idx, (columns, subframe, amplitudes, y, average) in enumerate(buffers):
+                    x = self.session_axes.distances(group_idx, sensor_id, sub_idx)
+                    to_complex(result._frame[:, columns], out=subframe)
+                    np.abs(subframe, out=amplitudes)
+                    np.mean(amplitudes, axis=0, out=y)
+                    if average is not None:
+                        # average += alpha * (y - average), ramping alpha down from 1 to
+                        # 1 / averaging_frames so the first frames are not pulled towards 0
+                        alpha = max(1 / self.averaging_frames, 1 / (self.num_updates + 1))
+                        np.subtract(y, average, out=y)
+                        y *= alpha
+                        average += y
+                        y = average
                     curves[sub_idx].setData(x, y)
 
-                    max_ = max(max_, np.max(y))
+                    max_ = max(max_, float(np.max(y)))
 
                 smooth_max = self.all_smooth_maxs[group_idx][sensor_id]
                 plot.setYRange(0, smooth_max.update(max_))
 
-
-def get_distances_m(config):
-    range_p = np.arange(config.num_points) * config.step_length + config.start_point
-    return range_p * 2.5e-3
+        self.num_updates += 1
 
 
 if __name__ == "__main__":
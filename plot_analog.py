@@ -2,77 +2,22 @@
 # All rights reserved
 
 from acconeer.exptool import a121
+from replay_client import open_client
+from analog_stream import AnalogSignalWriter
+import acconeer.exptool as et
 import numpy as np
 import matplotlib.pyplot as plt
 import math
-# Client is an object that is used to interact with the sensor.
-client = a121.Client.open(
-    # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
-    # or
-    # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
-    # or
-    # usb_device=True,
-    # or
-    # mock=True,
-    serial_port='COM4',
-    override_baudrate=115200
-)
-
-# Once the client is connected, information about the server can be accessed.
-print("Server Info:")
-print(client.server_info)
-
-# In order to get radar data from the server, we need to start a session.
-
-# To be able to start a session, we must first configure the session
-sensor_config = a121.SensorConfig()
-sensor_config.num_points = 15
-sensor_config.sweeps_per_frame = 10
-sensor_config.hwaas = 16
-client.setup_session(sensor_config)
-
-'''
-sensor config:
-        subsweeps: Optional[list[SubsweepConfig]] = None,
-        num_subsweeps: Optional[int] = None,
-        sweeps_per_frame: int = 1,
-        sweep_rate: Optional[float] = None,
-        frame_rate: Optional[float] = None,
-        continuous_sweep_mode: bool = False,
-        double_buffering: bool = False,
-        inter_frame_idle_state: IdleState = IdleState.DEEP_SLEEP,
-        inter_sweep_idle_state: IdleState = IdleState.READY,
-        start_point: Optional[int] = None,
-        num_points: Optional[int] = None,
-        step_length: Optional[int] = None,
-        profile: Optional[Profile] = None,
-        hwaas: Optional[int] = None,
-        receiver_gain: Optional[int] = None,
-        enable_tx: Optional[bool] = None,
-        enable_loopback: Optional[bool] = None,
-        phase_enhancement: Optional[bool] = None,
-        prf: Optional[PRF] = None,
-
-subsweeps: List of SubsweepConfig objects. Allows defining multiple subsweeps with different configurations (range, resolution, etc.) within a single frame.
-num_subsweeps: Number of subsweeps to create with default settings. Used as an alternative to providing explicit subsweep configurations.
-sweeps_per_frame: Number of sweeps that make up one frame. Higher values include more temporal samples in a single frame.
-sweep_rate: Sweep frequency in Hz. Defines how many sweeps per second are performed.
-frame_rate: Frame frequency in Hz. Defines how many frames per second are collected.
-continuous_sweep_mode: When enabled, minimizes delays between sweeps for more continuous data acquisition.
-double_buffering: Enables parallel processing of data collection and transmission for improved efficiency.
-inter_frame_idle_state: Sensor's idle state between frames. Balances power saving and response time.
-inter_sweep_idle_state: Sensor's idle state between sweeps within a frame.
-start_point: Starting point for measurement (distance-related). Used for direct configuration instead of subsweeps.
-num_points: Number of distance points to measure. Used for direct configuration instead of subsweeps.
-step_length: Spacing between distance points. Used for direct configuration instead of subsweeps.
-profile: Sensor profile preset that determines characteristics like sensitivity, speed, and accuracy.
-hwaas (Hardware Accelerated Average Samples): Number of hardware-averaged samples. Higher values improve SNR (Signal-to-Noise Ratio) but increase power consumption.
-receiver_gain: Receiver gain setting. Determines the amount of signal amplification.
-enable_tx: Transmitter enable flag. Typically set to true to enable the transmitter.
-enable_loopback: Loopback mode enable flag. Used for testing and diagnostic purposes.
-phase_enhancement: Phase enhancement feature enable flag. Improves the quality of phase information.
-prf (Pulse Repetition Frequency): Determines how frequently the radar emits pulses.
-'''
+
+# per-sample text labels are only drawn up to this many samples; above it they
+# cover the plot and their rendering time dominates
+ANNOTATION_LIMIT = 200
+
+# if set, main() streams frames until Ctrl-C into this file as one continuous analog signal
+# (.wav = float32 WAV, otherwise raw float32) instead of plotting a single frame.
+# see analog_stream.py for converting recordings
+ANALOG_STREAM_PATH = None
+ANALOG_STREAM_METHOD = 'magnitude'
 
 
 def process_complex_frame(complex_frame):
@@ -124,17 +69,16 @@ def convert_to_analog_signal(processed_data, method='magnitude'):
 def plot_iq_data(processed_data):
     
     rows, cols = processed_data['i_values'].shape
-    
+    annotate = rows * cols <= ANNOTATION_LIMIT
     
     fig = plt.figure(figsize=(16, 12))
     
-    # I/Q 좌표 평면에 데이터 점들 그리기
+    # I/Q 좌표 평면에 데이터 점들 그리기 (모든 점을 하나의 artist로)
     ax1 = fig.add_subplot(221)
-    for i in range(rows):
-        for j in range(cols):
-            ax1.plot(processed_data['i_values'][i, j], processed_data['q_values'][i, j], 'bo')
-            ax1.text(processed_data['i_values'][i, j], processed_data['q_values'][i, j], 
-                    f'({i},{j})', fontsize=8)
+    ax1.plot(processed_data['i_values'].ravel(), processed_data['q_values'].ravel(), 'bo')
+    if annotate:
+        for (i, j), i_value in np.ndenumerate(processed_data['i_values']):
+            ax1.text(i_value, processed_data['q_values'][i, j], f'({i},{j})', fontsize=8)
     ax1.set_title('I/Q data')
     ax1.set_xlabel('I (In-phase)')
     ax1.set_ylabel('Q (Quadrature)')
@@ -148,11 +92,9 @@ def plot_iq_data(processed_data):
     ax2.set_title('Magnitude')
     plt.colorbar(im2, ax=ax2)
     
-    
-    for i in range(rows):
-        for j in range(cols):
-            ax2.text(j, i, f'{processed_data["magnitude"][i, j]:.1f}',
-                    ha='center', va='center', color='w', fontsize=8)
+    if annotate:
+        for (i, j), value in np.ndenumerate(processed_data['magnitude']):
+            ax2.text(j, i, f'{value:.1f}', ha='center', va='center', color='w', fontsize=8)
     
     # 3. Phase 2d heatmap
     ax3 = fig.add_subplot(223)
@@ -177,6 +119,7 @@ def plot_iq_data(processed_data):
     
     plt.tight_layout()
     plt.savefig('plot_iq_data.png')
+    plt.close(fig)
 
 def plot_analog_signals(processed_data):
     
@@ -206,29 +149,118 @@ def plot_analog_signals(processed_data):
     
     return signals
 
-# Now we are ready to start it:
-client.start_session()
 
-n = 1
-results=[]
-for i in range(n):
-    # Data is retrieved from the sensor with "get_next".
-    result = client.get_next()
-    results.append(result.frame)
-    print(f"Result {i + 1}:")
-    print(result)
+def main():
+    # Client is an object that is used to interact with the sensor.
+    client = open_client(
+        # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+        # or
+        # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+        # or
+        # usb_device=True,
+        # or
+        # mock=True,
+        serial_port='COM4',
+        override_baudrate=115200
+    )
 
-    
-    
+    # Once the client is connected, information about the server can be accessed.
+    print("Server Info:")
+    print(client.server_info)
 
-# When we are done, we should close the connection to the server.
-client.close()
+    # In order to get radar data from the server, we need to start a session.
 
-for result in results:
-    processed_data = process_complex_frame(result)
-    
-    
-    plot_iq_data(processed_data)
-    
-   
-    signals = plot_analog_signals(processed_data)
\ No newline at end of file
+    # To be able to start a session, we must first configure the session
+    sensor_config = a121.SensorConfig()
+    sensor_config.num_points = 15
+    sensor_config.sweeps_per_frame = 10
+    sensor_config.hwaas = 16
+    client.setup_session(sensor_config)
+
+    '''
+    sensor config:
+            subsweeps: Optional[list[SubsweepConfig]] = None,
+            num_subsweeps: Optional[int] = None,
+            sweeps_per_frame: int = 1,
+            sweep_rate: Optional[float] = None,
+            frame_rate: Optional[float] = None,
+            continuous_sweep_mode: bool = False,
+            double_buffering: bool = False,
+            inter_frame_idle_state: IdleState = IdleState.DEEP_SLEEP,
+            inter_sweep_idle_state: IdleState = IdleState.READY,
+            start_point: Optional[int] = None,
+            num_points: Optional[int] = None,
+            step_length: Optional[int] = None,
+            profile: Optional[Profile] = None,
+            hwaas: Optional[int] = None,
+            receiver_gain: Optional[int] = None,
+            enable_tx: Optional[bool] = None,
+            enable_loopback: Optional[bool] = None,
+            phase_enhancement: Optional[bool] = None,
+            prf: Optional[PRF] = None,
+
+    subsweeps: List of SubsweepConfig objects. Allows defining multiple subsweeps with different configurations (range, resolution, etc.) within a single frame.
+    num_subsweeps: Number of subsweeps to create with default settings. Used as an alternative to providing explicit subsweep configurations.
+    sweeps_per_frame: Number of sweeps that make up one frame. Higher values include more temporal samples in a single frame.
+    sweep_rate: Sweep frequency in Hz. Defines how many sweeps per second are performed.
+    frame_rate: Frame frequency in Hz. Defines how many frames per second are collected.
+    continuous_sweep_mode: When enabled, minimizes delays between sweeps for more continuous data acquisition.
+    double_buffering: Enables parallel processing of data collection and transmission for improved efficiency.
+    inter_frame_idle_state: Sensor's idle state between frames. Balances power saving and response time.
+    inter_sweep_idle_state: Sensor's idle state between sweeps within a frame.
+    start_point: Starting point for measurement (distance-related). Used for direct configuration instead of subsweeps.
+    num_points: Number of distance points to measure. Used for direct configuration instead of subsweeps.
+    step_length: Spacing between distance points. Used for direct configuration instead of subsweeps.
+    profile: Sensor profile preset that determines characteristics like sensitivity, speed, and accuracy.
+    hwaas (Hardware Accelerated Average Samples): Number of hardware-averaged samples. Higher values improve SNR (Signal-to-Noise Ratio) but increase power consumption.
+    receiver_gain: Receiver gain setting. Determines the amount of signal amplification.
+    enable_tx: Transmitter enable flag. Typically set to true to enable the transmitter.
+    enable_loopback: Loopback mode enable flag. Used for testing and diagnostic purposes.
+    phase_enhancement: Phase enhancement feature enable flag. Improves the quality of phase information.
+    prf (Pulse Repetition Frequency): Determines how frequently the radar emits pulses.
+    '''
+
+    # Now we are ready to start it:
+    client.start_session()
+
+    if ANALOG_STREAM_PATH:
+        interrupt_handler = et.utils.ExampleInterruptHandler()
+        print("Press Ctrl-C to end session")
+        # without a configured frame rate the sample rate is estimated from the result ticks
+        sample_rate = None
+        if sensor_config.frame_rate:
+            sample_rate = round(sensor_config.frame_rate * sensor_config.sweeps_per_frame * sensor_config.num_points)
+        with AnalogSignalWriter(ANALOG_STREAM_PATH, ANALOG_STREAM_METHOD, sample_rate) as writer:
+            while not interrupt_handler.got_signal:
+                writer.write_result(client.get_next())
+        client.close()
+        print(writer.summary())
+        return
+
+    n = 1
+    results=[]
+    for i in range(n):
+        # Data is retrieved from the sensor with "get_next".
+        result = client.get_next()
+        results.append(result.frame)
+        print(f"Result {i + 1}:")
+        print(result)
+
+
+
+
+    # When we are done, we should close the connection to the server.
+    client.close()
+
+    for result in results:
+        processed_data = process_complex_frame(result)
+
+
+        plot_iq_data(processed_data)
+
+
+        signals = plot_analog_signals(processed_data)
+
+
+if __name__ == "__main__":
+    main()
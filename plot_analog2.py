@@ -2,6 +2,8 @@
 # All rights reserved
 
 from acconeer.exptool import a121
+from replay_client import open_client
+from line_panel_renderer import LinePanelExporter
 import numpy as np
 import matplotlib.pyplot as plt
 import math
@@ -10,111 +12,75 @@ NUM_POINTS=15
 SWEEP_PER_FRAME=10
 HWAAS=16
 
-# Client is an object that is used to interact with the sensor.
-client = a121.Client.open(
-    # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
-    # or
-    # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
-    # or
-    # usb_device=True,
-    # or
-    # mock=True,
-    serial_port='COM4',
-    override_baudrate=115200
-)
-
-# Once the client is connected, information about the server can be accessed.
-print("Server Info:")
-print(client.server_info)
-
-# In order to get radar data from the server, we need to start a session.
-
-# To be able to start a session, we must first configure the session
-sensor_config = a121.SensorConfig()
-sensor_config.num_points = NUM_POINTS
-sensor_config.sweeps_per_frame = SWEEP_PER_FRAME
-sensor_config.hwaas = HWAAS
-client.setup_session(sensor_config)
-
-'''
-sensor config:
-        subsweeps: Optional[list[SubsweepConfig]] = None,
-        num_subsweeps: Optional[int] = None,
-        sweeps_per_frame: int = 1,
-        sweep_rate: Optional[float] = None,
-        frame_rate: Optional[float] = None,
-        continuous_sweep_mode: bool = False,
-        double_buffering: bool = False,
-        inter_frame_idle_state: IdleState = IdleState.DEEP_SLEEP,
-        inter_sweep_idle_state: IdleState = IdleState.READY,
-        start_point: Optional[int] = None,
-        num_points: Optional[int] = None,
-        step_length: Optional[int] = None,
-        profile: Optional[Profile] = None,
-        hwaas: Optional[int] = None,
-        receiver_gain: Optional[int] = None,
-        enable_tx: Optional[bool] = None,
-        enable_loopback: Optional[bool] = None,
-        phase_enhancement: Optional[bool] = None,
-        prf: Optional[PRF] = None,
-
-subsweeps: List of SubsweepConfig objects. Allows defining multiple subsweeps with different configurations (range, resolution, etc.) within a single frame.
-num_subsweeps: Number of subsweeps to create with default settings. Used as an alternative to providing explicit subsweep configurations.
-sweeps_per_frame: Number of sweeps that make up one frame. Higher values include more temporal samples in a single frame.
-sweep_rate: Sweep frequency in Hz. Defines how many sweeps per second are performed.
-frame_rate: Frame frequency in Hz. Defines how many frames per second are collected.
-continuous_sweep_mode: When enabled, minimizes delays between sweeps for more continuous data acquisition.
-double_buffering: Enables parallel processing of data collection and transmission for improved efficiency.
-inter_frame_idle_state: Sensor's idle state between frames. Balances power saving and response time.
-inter_sweep_idle_state: Sensor's idle state between sweeps within a frame.
-start_point: Starting point for measurement (distance-related). Used for direct configuration instead of subsweeps.
-num_points: Number of distance points to measure. Used for direct configuration instead of subsweeps.
-step_length: Spacing between distance points. Used for direct configuration instead of subsweeps.
-profile: Sensor profile preset that determines characteristics like sensitivity, speed, and accuracy.
-hwaas (Hardware Accelerated Average Samples): Number of hardware-averaged samples. Higher values improve SNR (Signal-to-Noise Ratio) but increase power consumption.
-receiver_gain: Receiver gain setting. Determines the amount of signal amplification.
-enable_tx: Transmitter enable flag. Typically set to true to enable the transmitter.
-enable_loopback: Loopback mode enable flag. Used for testing and diagnostic purposes.
-phase_enhancement: Phase enhancement feature enable flag. Improves the quality of phase information.
-prf (Pulse Repetition Frequency): Determines how frequently the radar emits pulses.
-'''
+# BATCH_EXPORT=True writes the distance/sweep panels with LinePanelExporter (one reused figure
+# per worker process) instead of a new figure per panel.
+# EXPORT_OUTPUT is 'png' (one file per panel, same names) or 'pdf' (one multi-page file per frame)
+# EXPORT_WORKERS: None = one per CPU core, 0 = render in this process
+BATCH_EXPORT = True
+EXPORT_OUTPUT = 'png'
+EXPORT_WORKERS = None
+
 import numpy as np
 import matplotlib.pyplot as plt
 import os
 
 class A121Visualizer:
-    def __init__(self, num_points=15, sweeps_per_frame=10, hwaas=16):
+    # dtype is the float type of the magnitude/phase/I/Q arrays returned by
+    # process_frame_data (np.float32 halves their memory for long recordings)
+    def __init__(self, num_points=15, sweeps_per_frame=10, hwaas=16, dtype=np.float64):
        
         self.num_points = num_points
         self.sweeps_per_frame = sweeps_per_frame
         self.hwaas = hwaas
+        self.dtype = dtype
         
         
         
     
-    def process_frame_data(self, frame_data):
+    def allocate_output(self, num_frames=None):
+        # output buffers for process_frame_data(..., out=...), for one frame
+        # (num_frames=None) or a stack of num_frames frames
+        shape = (self.sweeps_per_frame, self.num_points)
+        if num_frames is not None:
+            shape = (num_frames,) + shape
+        return {key: np.empty(shape, dtype=self.dtype) for key in ('magnitude', 'phase', 'i_values', 'q_values')}
+
+    def process_frame_data(self, frame_data, out=None):
+        # frame_data: one frame (sweeps x points, or flattened) or a stack of
+        # frames (frames x sweeps x points). All quantities are computed for the
+        # whole stack at once, into `out` (see allocate_output) if given.
         # 입력 데이터가 1D 배열이면 재구성
         if frame_data.ndim == 1:
             if len(frame_data) == self.sweeps_per_frame * self.num_points:
                 frame_data = frame_data.reshape(self.sweeps_per_frame, self.num_points)
             else:
                 raise ValueError(f"입력 데이터 길이 ({len(frame_data)})가 예상된 크기 ({self.sweeps_per_frame * self.num_points})와 일치하지 않습니다.")
-        
-        # 복소수 데이터인 경우 크기와 위상 계산
-        if np.iscomplexobj(frame_data):
-            magnitude = np.abs(frame_data)
-            phase = np.angle(frame_data)
-            i_values = np.real(frame_data)
-            q_values = np.imag(frame_data)
-        
+        if frame_data.shape[-2:] != (self.sweeps_per_frame, self.num_points):
+            raise ValueError(f"입력 데이터 형태 {frame_data.shape}가 예상된 크기 (..., {self.sweeps_per_frame}, {self.num_points})와 일치하지 않습니다.")
+
+        if out is None:
+            out = self.allocate_output(frame_data.shape[0] if frame_data.ndim == 3 else None)
+
+        # 크기와 위상 계산
+        i_values = out['i_values']
+        q_values = out['q_values']
+        np.copyto(i_values, np.real(frame_data), casting='same_kind')
+        np.copyto(q_values, np.imag(frame_data), casting='same_kind')
+        np.abs(frame_data, out=out['magnitude'], casting='same_kind')
+        np.arctan2(q_values, i_values, out=out['phase'])
         
         return {
             'complex': frame_data if np.iscomplexobj(frame_data) else None,
-            'magnitude': magnitude,
-            'phase': phase,
+            'magnitude': out['magnitude'],
+            'phase': out['phase'],
             'i_values': i_values,
             'q_values': q_values
         }
+
+    @staticmethod
+    def select_frame(processed_data, index):
+        # the processed data of one frame out of a stacked process_frame_data result
+        return {key: None if value is None else value[index] for key, value in processed_data.items()}
     
     def plot_distance_line(self, processed_data):
         
@@ -221,32 +187,113 @@ class A121Visualizer:
             
             plt.savefig(f'./sweep/sweep_of_distance_point_{point+1}.png', dpi=300)
             plt.close(fig)
-            
-    
-    
-# Now we are ready to start it:
-client.start_session()
 
-n = 1
-results=[]
-for i in range(n):
-    # Data is retrieved from the sensor with "get_next".
-    result = client.get_next()
-    print(result)
-    results.append(result.frame)
 
-# When we are done, we should close the connection to the server.
-client.close()
+def main():
+    # Client is an object that is used to interact with the sensor.
+    client = open_client(
+        # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
+        # or
+        # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
+        # or
+        # usb_device=True,
+        # or
+        # mock=True,
+        serial_port='COM4',
+        override_baudrate=115200
+    )
+
+    # Once the client is connected, information about the server can be accessed.
+    print("Server Info:")
+    print(client.server_info)
 
+    # In order to get radar data from the server, we need to start a session.
 
-for result in results:
-     # 시각화 객체 생성
+    # To be able to start a session, we must first configure the session
+    sensor_config = a121.SensorConfig()
+    sensor_config.num_points = NUM_POINTS
+    sensor_config.sweeps_per_frame = SWEEP_PER_FRAME
+    sensor_config.hwaas = HWAAS
+    client.setup_session(sensor_config)
+
+    '''
+    sensor config:
+            subsweeps: Optional[list[SubsweepConfig]] = None,
+            num_subsweeps: Optional[int] = None,
+            sweeps_per_frame: int = 1,
+            sweep_rate: Optional[float] = None,
+            frame_rate: Optional[float] = None,
+            continuous_sweep_mode: bool = False,
+            double_buffering: bool = False,
+            inter_frame_idle_state: IdleState = IdleState.DEEP_SLEEP,
+            inter_sweep_idle_state: IdleState = IdleState.READY,
+            start_point: Optional[int] = None,
+            num_points: Optional[int] = None,
+            step_length: Optional[int] = None,
+            profile: Optional[Profile] = None,
+            hwaas: Optional[int] = None,
+            receiver_gain: Optional[int] = None,
+            enable_tx: Optional[bool] = None,
+            enable_loopback: Optional[bool] = None,
+            phase_enhancement: Optional[bool] = None,
+            prf: Optional[PRF] = None,
+
+    subsweeps: List of SubsweepConfig objects. Allows defining multiple subsweeps with different configurations (range, resolution, etc.) within a single frame.
+    num_subsweeps: Number of subsweeps to create with default settings. Used as an alternative to providing explicit subsweep configurations.
+    sweeps_per_frame: Number of sweeps that make up one frame. Higher values include more temporal samples in a single frame.
+    sweep_rate: Sweep frequency in Hz. Defines how many sweeps per second are performed.
+    frame_rate: Frame frequency in Hz. Defines how many frames per second are collected.
+    continuous_sweep_mode: When enabled, minimizes delays between sweeps for more continuous data acquisition.
+    double_buffering: Enables parallel processing of data collection and transmission for improved efficiency.
+    inter_frame_idle_state: Sensor's idle state between frames. Balances power saving and response time.
+    inter_sweep_idle_state: Sensor's idle state between sweeps within a frame.
+    start_point: Starting point for measurement (distance-related). Used for direct configuration instead of subsweeps.
+    num_points: Number of distance points to measure. Used for direct configuration instead of subsweeps.
+    step_length: Spacing between distance points. Used for direct configuration instead of subsweeps.
+    profile: Sensor profile preset that determines characteristics like sensitivity, speed, and accuracy.
+    hwaas (Hardware Accelerated Average Samples): Number of hardware-averaged samples. Higher values improve SNR (Signal-to-Noise Ratio) but increase power consumption.
+    receiver_gain: Receiver gain setting. Determines the amount of signal amplification.
+    enable_tx: Transmitter enable flag. Typically set to true to enable the transmitter.
+    enable_loopback: Loopback mode enable flag. Used for testing and diagnostic purposes.
+    phase_enhancement: Phase enhancement feature enable flag. Improves the quality of phase information.
+    prf (Pulse Repetition Frequency): Determines how frequently the radar emits pulses.
+    '''
+
+    # Now we are ready to start it:
+    client.start_session()
+
+    n = 1
+    results=[]
+    for i in range(n):
+        # Data is retrieved from the sensor with "get_next".
+        result = client.get_next()
+        print(result)
+        results.append(result.frame)
+
+    # When we are done, we should close the connection to the server.
+    client.close()
+
+
+    # 시각화 객체 생성
     visualizer = A121Visualizer(
         num_points=NUM_POINTS,
         sweeps_per_frame=SWEEP_PER_FRAME,
         hwaas=HWAAS,
-       
+
     )
-    processed_data = visualizer.process_frame_data(result)
-    visualizer.plot_distance_line(processed_data)
-    visualizer.plot_sweep_line(processed_data)
\ No newline at end of file
+    # all frames are processed in one call
+    processed_data = visualizer.process_frame_data(np.stack(results))
+    if BATCH_EXPORT:
+        with LinePanelExporter(EXPORT_OUTPUT, workers=EXPORT_WORKERS) as exporter:
+            for frame in range(len(results)):
+                exporter.submit(frame, visualizer.select_frame(processed_data, frame))
+        print(exporter.summary())
+    else:
+        for frame in range(len(results)):
+            frame_data = visualizer.select_frame(processed_data, frame)
+            visualizer.plot_distance_line(frame_data)
+            visualizer.plot_sweep_line(frame_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from acconeer.exptool import a121
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# Session profiles are TOML or JSON files describing an a121.SessionConfig:
+#
+#   description = "one sensor, 10 sweeps of 100 points"
+#   extended = true                   # default true, every pipeline works on extended results
+#   update_rate = 20.0                # optional
+#
+#   [[groups]]                        # one table per group
+#   [groups.1]                        # sensor id -> a121.SensorConfig keyword arguments
+#   sweeps_per_frame = 10
+#   num_points = 100                  # subsweep parameters may be given here if there is one subsweep,
+#   [[groups.1.subsweeps]]            # or per subsweep (a121.SubsweepConfig keyword arguments)
+#   start_point = 70
+#
+# Enums are given by name (profile = "PROFILE_2", prf = "PRF_13_0_MHz").
+# JSON profiles have the same structure ({"groups": [{"1": {...}}], ...}).
+PROFILE_DIR = Path(__file__).resolve().parent / "profiles"
+PROFILE_SUFFIXES = (".toml", ".json")
+
+# metadata of every profile set up on a sensor, see Profile.store_metadata
+METADATA_CACHE = PROFILE_DIR / ".metadata_cache.json"
+
+# keys of a profile that are not sensor config parameters, and sensor config parameters
+# that are not subsweep parameters (see _apply_override)
+_SESSION_KEYS = ("description", "extended", "update_rate")
+_SENSOR_KEYS = (
+    "sweeps_per_frame",
+    "sweep_rate",
+    "frame_rate",
+    "continuous_sweep_mode",
+    "double_buffering",
+    "inter_frame_idle_state",
+    "inter_sweep_idle_state",
+)
+
+_profiles: dict[tuple, Profile] = {}
+
+
+class Profile:
+    # A validated session config loaded from a profile file. The extended
+    # metadata the server returns for it is cached in METADATA_CACHE, keyed by
+    # the profile name and valid for the same config on the same kind of server,
+    # so data lengths and max_sweep_rate are known without a sensor afterwards.
+    def __init__(self, name: str, path: Path | None, session_config: a121.SessionConfig, description: str = "") -> None:
+        self.name = name
+        self.path = path
+        self.session_config = session_config
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f"Profile({self.name!r})"
+
+    @property
+    def first_sensor(self) -> tuple[int, a121.SensorConfig]:
+        # (sensor id, sensor config) of the first sensor in the first group
+        return next(iter(self.session_config.groups[0].items()))
+
+    def _cache_key(self, server_info: a121.ServerInfo) -> dict:
+        return {
+            "session_config": json.loads(self.session_config.to_json()),
+            "rss_version": server_info.rss_version,
+            "hardware_name": server_info.hardware_name,
+        }
+
+    def setup_session(self, client) -> list[dict[int, a121.Metadata]]:
+        # client.setup_session(), storing the metadata in the cache
+        extended_metadata = client.setup_session(self.session_config)
+        self.store_metadata(client.server_info, extended_metadata)
+        return extended_metadata
+
+    def store_metadata(self, server_info: a121.ServerInfo, extended_metadata) -> None:
+        from recording import _as_extended
+
+        cache = _read_cache()
+        cache[self.name] = {
+            **self._cache_key(server_info),
+            "metadata": [
+                {str(sensor_id): json.loads(m.to_json()) for sensor_id, m in group.items()}
+                for group in _as_extended(self.session_config, extended_metadata)
+            ],
+        }
+        tmp_path = METADATA_CACHE.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(cache, indent=1))
+        os.replace(tmp_path, METADATA_CACHE)
+
+    def cached_metadata(self, server_info: a121.ServerInfo | None = None) -> list[dict[int, a121.Metadata]] | None:
+        # the metadata stored for this profile, None if there is none or the config
+        # has changed since; with server_info it must also come from the same kind of server
+        entry = _read_cache().get(self.name)
+        if entry is None or entry["session_config"] != json.loads(self.session_config.to_json()):
+            return None
+        if server_info is not None and any(entry[k] != v for k, v in self._cache_key(server_info).items()):
+            return None
+        return [
+            {int(sensor_id): a121.Metadata.from_json(json.dumps(m)) for sensor_id, m in group.items()}
+            for group in entry["metadata"]
+        ]
+
+    def summary(self) -> str:
+        lines = [f"{self.name}: {self.description}" if self.description else self.name]
+        extended_metadata = self.cached_metadata()
+        for group_idx, group in enumerate(self.session_config.groups):
+            for sensor_id, sensor_config in group.items():
+                line = (
+                    f"  group {group_idx} sensor {sensor_id}: {len(sensor_config.subsweeps)} subsweeps, "
+                    f"{sensor_config.sweeps_per_frame} sweeps/frame"
+                )
+                if extended_metadata is not None:
+                    metadata = extended_metadata[group_idx][sensor_id]
+                    line += (
+                        f", {metadata.frame_data_length} points/frame ({metadata.frame_data_length * 4} bytes), "
+                        f"max sweep rate {metadata.max_sweep_rate:.0f} Hz"
+                    )
+                lines.append(line)
+        if extended_metadata is None:
+            lines.append("  (no cached metadata, run it on a sensor once)")
+        return "\n".join(lines)
+
+
+def _read_cache() -> dict:
+    try:
+        return json.loads(METADATA_CACHE.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _read_file(path: Path) -> dict:
+    if path.suffix == ".json":
+        return json.loads(path.read_text())
+    if tomllib is None:
+        raise ValueError(f"{path}: TOML profiles need Python 3.11 or the tomli package, use a .json profile instead")
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def _parse_value(text: str):
+    # numbers, true/false/null as JSON, anything else (e.g. enum names) as a string
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _apply_override(profile_dict: dict, override: str) -> None:
+    # "key=value" sets a session key, or key in every sensor (and each of its
+    # subsweeps for subsweep parameters); "groups.0.1.key=value" sets it only there
+    path, sep, text = override.partition("=")
+    if not sep:
+        raise ValueError(f"override {override!r} is not of the form key=value")
+    value = _parse_value(text)
+    *parents, key = path.split(".")
+    if not parents and key in _SESSION_KEYS:
+        profile_dict[key] = value
+    elif not parents:
+        for group in profile_dict["groups"]:
+            for sensor_dict in group.values():
+                if "subsweeps" in sensor_dict and key not in _SENSOR_KEYS:
+                    for subsweep_dict in sensor_dict["subsweeps"]:
+                        subsweep_dict[key] = value
+                else:
+                    sensor_dict[key] = value
+    else:
+        target = profile_dict
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        target[key] = value
+
+
+def _sensor_config(sensor_dict: dict) -> a121.SensorConfig:
+    kwargs = dict(sensor_dict)
+    if "subsweeps" in kwargs:
+        kwargs["subsweeps"] = [a121.SubsweepConfig(**subsweep_dict) for subsweep_dict in kwargs["subsweeps"]]
+    return a121.SensorConfig(**kwargs)
+
+
+def session_config_from_dict(profile_dict: dict) -> a121.SessionConfig:
+    return a121.SessionConfig(
+        [
+            {int(sensor_id): _sensor_config(sensor_dict) for sensor_id, sensor_dict in group.items()}
+            for group in profile_dict["groups"]
+        ],
+        extended=profile_dict.get("extended", True),
+        update_rate=profile_dict.get("update_rate"),
+    )
+
+
+def find_profile(name_or_path) -> Path:
+    # a path to a profile file, or the name of one in PROFILE_DIR
+    path = Path(name_or_path)
+    if path.suffix in PROFILE_SUFFIXES and path.is_file():
+        return path.resolve()
+    for suffix in PROFILE_SUFFIXES:
+        candidate = PROFILE_DIR / f"{name_or_path}{suffix}"
+        if candidate.is_file():
+            return candidate
+    raise ValueError(f"no profile {name_or_path!r}, available: {', '.join(available_profiles())}")
+
+
+def available_profiles() -> list[str]:
+    # the metadata cache is a dot file
+    return sorted(
+        {path.stem for suffix in PROFILE_SUFFIXES for path in PROFILE_DIR.glob(f"*{suffix}") if path.name[0] != "."}
+    )
+
+
+def load_profile(name_or_path, overrides=()) -> Profile:
+    # Loads, builds and validates a profile. Profiles are kept per file (until
+    # it is modified) and overrides, so loading one again does not validate again.
+    # A Profile is returned as it is.
+    if isinstance(name_or_path, Profile):
+        return name_or_path
+    path = find_profile(name_or_path)
+    key = (path, path.stat().st_mtime_ns, tuple(overrides))
+    if key in _profiles:
+        return _profiles[key]
+
+    profile_dict = _read_file(path)
+    try:
+        for override in overrides:
+            _apply_override(profile_dict, override)
+        session_config = session_config_from_dict(profile_dict)
+        session_config.validate()
+    except (KeyError, IndexError, TypeError, ValueError, a121.ValidationError) as e:
+        raise ValueError(f"invalid profile {path}: {e}") from e
+
+    # an overridden config is another config, so its metadata is cached separately
+    name = path.stem if not overrides else f"{path.stem}[{','.join(overrides)}]"
+    profile = Profile(name, path, session_config, profile_dict.get("description", ""))
+    _profiles[key] = profile
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="list and check session profiles")
+    parser.add_argument("profiles", nargs="*", help="profile names or files (default: all in profiles/)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--show", action="store_true", help="print the resulting session configs")
+    args = parser.parse_args()
+    for name in args.profiles or available_profiles():
+        try:
+            profile = load_profile(name, args.overrides)
+        except ValueError as e:
+            print(e)
+            continue
+        print(profile.summary())
+        if args.show:
+            print(profile.session_config)
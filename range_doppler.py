@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from recording import to_complex
+
+try:
+    # scipy's FFT computes complex64 input in single precision; numpy's is slower
+    # for complex64 than for complex128
+    from scipy import fft
+except ImportError:
+    fft = np.fft
+
+
+class RangeDopplerEngine:
+    # Computes the distance-velocity map of many frames in one vectorized call.
+    # The math is the same as distance_velocity_map of the sparse_iq Processor:
+    # normalized hanning window over the sweeps, FFT along the sweep (slow time)
+    # axis, fftshift so zero velocity is in the middle, and magnitude.
+    #
+    # Raw int16 frames (result._frame, raw FrameRingBuffer) are converted to
+    # complex64 once and computed in single precision; complex frames keep
+    # their precision.
+    def __init__(self, sweeps_per_frame: int) -> None:
+        window = np.hanning(sweeps_per_frame)
+        window /= np.sum(window)
+        # With an even number of sweeps, fftshift of the FFT is the FFT of the
+        # sweeps multiplied by (-1)^n, so the shift is folded into the window
+        self.shift_in_window = sweeps_per_frame % 2 == 0
+        if self.shift_in_window:
+            window[1::2] *= -1
+        self.window = window[:, None]
+        self.window32 = self.window.astype(np.float32)
+        self.sweeps_per_frame = sweeps_per_frame
+
+    def process(
+        self,
+        frames: npt.NDArray[np.complexfloating],
+        db: bool = False,
+        out: npt.NDArray[np.floating] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        # frames: (sweeps, points) or (N, sweeps, points) complex or raw int16 array
+        # returns maps with the same shape, linear magnitude or 20*log10 if db=True
+        # (float32 for raw and complex64 frames)
+        if frames.shape[-2] != self.sweeps_per_frame:
+            raise ValueError(
+                f"expected {self.sweeps_per_frame} sweeps per frame, got shape {frames.shape}"
+            )
+
+        if frames.dtype.names is not None:
+            # the converted copy is windowed in place
+            windowed = to_complex(frames)
+            windowed *= self.window32
+        elif frames.dtype == np.complex64:
+            windowed = frames * self.window32
+        else:
+            windowed = frames * self.window
+        z_ft = fft.fft(windowed, axis=-2)
+        if not self.shift_in_window:
+            z_ft = fft.fftshift(z_ft, axes=-2)
+        maps = np.abs(z_ft, out=out)
+
+        if db:
+            # avoid log10(0) for all-zero frames
+            np.maximum(maps, np.finfo(maps.dtype).tiny, out=maps)
+            np.log10(maps, out=maps)
+            maps *= 20
+        return maps
+
+    def process_ring_buffer(self, ring_buffer, batch_size: int = 256, db: bool = False):
+        # yields (first absolute index, maps) for everything held in a FrameRingBuffer,
+        # batch_size frames at a time
+        first = ring_buffer.first_index
+        while first < ring_buffer.count:
+            n = min(batch_size, ring_buffer.count - first)
+            slots = np.arange(first, first + n) % ring_buffer.capacity
+            yield first, self.process(ring_buffer.frames[slots], db=db)
+            first += n
+
+
+def compare_with_processor(num_frames=500, sweeps_per_frame=10, num_points=100, seed=0):
+    # Runs the same frames through the sparse_iq Processor (AmplitudeMethod.COHERENT)
+    # and through RangeDopplerEngine, checks the maps agree and reports frames/second.
+    from acconeer.exptool import a121
+    from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod, Processor, ProcessorConfig
+
+    from recording import make_result
+
+    sensor_id = 1
+    sensor_config = a121.SensorConfig(sweeps_per_frame=sweeps_per_frame, num_points=num_points)
+    session_config = a121.SessionConfig([{sensor_id: sensor_config}], extended=True)
+    processor_config = ProcessorConfig()
+    processor_config.amplitude_method = AmplitudeMethod.COHERENT
+    processor = Processor(session_config=session_config, processor_config=processor_config)
+
+    rng = np.random.default_rng(seed)
+    raw_frames = np.zeros(
+        (num_frames, sweeps_per_frame, num_points), dtype=[("real", "<i2"), ("imag", "<i2")]
+    )
+    raw_frames["real"] = rng.integers(-2000, 2000, raw_frames.shape)
+    raw_frames["imag"] = rng.integers(-2000, 2000, raw_frames.shape)
+
+    metadata = a121.Metadata(
+        frame_data_length=sweeps_per_frame * num_points,
+        sweep_data_length=num_points,
+        subsweep_data_offset=np.array([0]),
+        subsweep_data_length=np.array([num_points]),
+        calibration_temperature=25,
+        tick_period=0,
+        base_step_length_m=0.0025,
+        max_sweep_rate=10000.0,
+    )
+    results = [make_result(raw, metadata, ticks_per_second=1000, tick=i) for i, raw in enumerate(raw_frames)]
+
+    start = time.perf_counter()
+    processor_maps = np.stack(
+        [
+            processor.process([{sensor_id: result}])[0][sensor_id][0].distance_velocity_map
+            for result in results
+        ]
+    )
+    processor_time = time.perf_counter() - start
+
+    frames = raw_frames["real"] + 1j * raw_frames["imag"]
+    engine = RangeDopplerEngine(sweeps_per_frame)
+    start = time.perf_counter()
+    engine_maps = engine.process(frames)
+    engine_time = time.perf_counter() - start
+
+    max_error = np.max(np.abs(engine_maps - processor_maps))
+    print(f"{num_frames} frames of {sweeps_per_frame} sweeps x {num_points} points")
+    print(f"max abs difference to Processor: {max_error:.3e}")
+    print(f"Processor: {num_frames / processor_time:10.1f} frames/s")
+    print(f"engine:    {num_frames / engine_time:10.1f} frames/s")
+    if not np.allclose(engine_maps, processor_maps):
+        raise AssertionError("RangeDopplerEngine does not match the sparse_iq Processor")
+
+
+def compare_raw_path(num_frames=20000, sweeps_per_frame=10, num_points=100, batch_size=256, seed=0):
+    # A long capture held in a FrameRingBuffer and turned into maps, once with
+    # complex128 frames (result.frame) and once kept as raw int16 frames that
+    # are converted to complex64 per batch. Reports memory and throughput and
+    # checks that the maps agree.
+    from benchmark import BenchmarkInput
+    from recording import INT16_COMPLEX
+    from ring_buffer import FrameRingBuffer
+
+    data = BenchmarkInput(num_points, sweeps_per_frame, min(num_frames, 1000), seed=seed)
+    results = [extended_result[0][data.sensor_id] for extended_result in data.extended_results]
+    engine = RangeDopplerEngine(sweeps_per_frame)
+
+    print(f"{num_frames} frames of {sweeps_per_frame} sweeps x {num_points} points")
+    all_maps = {}
+    for name, dtype in (("complex128", np.complex128), ("int16", INT16_COMPLEX)):
+        ring_buffer = FrameRingBuffer(num_frames, sweeps_per_frame, num_points, dtype)
+        start = time.perf_counter()
+        for i in range(num_frames):
+            result = results[i % len(results)]
+            # what the capture loop stores: the converted frame or the one on the wire
+            ring_buffer.push(result.frame if name == "complex128" else result._frame, result.tick)
+        push_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_bytes = 0
+        maps = None
+        for _, maps in engine.process_ring_buffer(ring_buffer, batch_size):
+            batch_bytes = max(batch_bytes, maps.nbytes)
+        process_time = time.perf_counter() - start
+        all_maps[name] = maps
+
+        print(
+            f"{name:>10}: buffer {ring_buffer.frames.nbytes / 1e6:8.1f} MB, "
+            f"push {push_time / num_frames * 1e6:6.2f} us/frame, "
+            f"maps {num_frames / process_time:8.0f} frames/s ({batch_bytes / 1e6:.1f} MB per batch of {batch_size})"
+        )
+
+    reference = all_maps["complex128"]
+    error = np.max(np.abs(all_maps["int16"] - reference)) / np.max(reference)
+    print(f"max difference of the int16 maps: {error:.1e} of the peak")
+    if error > 1e-5:
+        raise AssertionError("the int16 path does not match the complex128 path")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare RangeDopplerEngine with the sparse_iq Processor")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--sweeps", type=int, default=10)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--raw-path", action="store_true",
+                        help="compare a long capture kept as raw int16 frames with complex128 frames instead")
+    args = parser.parse_args()
+    if args.raw_path:
+        compare_raw_path(args.frames, args.sweeps, args.points)
+    else:
+        compare_with_processor(args.frames, args.sweeps, args.points)
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+import numpy.typing as npt
+
+from acconeer.exptool import a121
+
+# File layout:
+#   8 bytes   magic b"XM125REC"
+#   4 bytes   format version (little endian uint32)
+#   4 bytes   data offset in bytes (little endian uint32)
+#   JSON header (utf-8) describing the session, padded with spaces up to the data offset
+#   fixed-size records, one per get_next() call, appended until the file is closed
+#
+# A record has one field per (group, sensor) named "g{group}_s{sensor}", holding
+# tick, temperature, the result flags and the frame as int16 real/imag pairs
+# exactly as delivered by the sensor. Because every record has the same size,
+# the data part of the file can be mapped as one numpy array.
+MAGIC = b"XM125REC"
+VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_DATA_ALIGNMENT = 64
+
+INT16_COMPLEX = np.dtype([("real", "<i2"), ("imag", "<i2")])
+
+
+def _entry_dtype(metadata: a121.Metadata) -> np.dtype:
+    sweeps_per_frame = metadata.frame_data_length // metadata.sweep_data_length
+    return np.dtype(
+        [
+            ("tick", "<i8"),
+            ("temperature", "<i2"),
+            ("data_saturated", "?"),
+            ("frame_delayed", "?"),
+            ("calibration_needed", "?"),
+            ("frame", INT16_COMPLEX, (sweeps_per_frame, metadata.sweep_data_length)),
+        ]
+    )
+
+
+def _entry_name(group_idx: int, sensor_id: int) -> str:
+    return f"g{group_idx}_s{sensor_id}"
+
+
+def _record_dtype(extended_metadata: list[dict[int, a121.Metadata]]) -> np.dtype:
+    return np.dtype(
+        [
+            (_entry_name(group_idx, sensor_id), _entry_dtype(metadata))
+            for group_idx, group in enumerate(extended_metadata)
+            for sensor_id, metadata in group.items()
+        ]
+    )
+
+
+def make_result(
+    frame,
+    metadata: a121.Metadata,
+    ticks_per_second: int,
+    tick: int = 0,
+    temperature: int = 25,
+    data_saturated: bool = False,
+    frame_delayed: bool = False,
+    calibration_needed: bool = False,
+) -> a121.Result:
+    # builds an a121.Result around a raw int16 frame, like the ones returned by get_next()
+    from acconeer.exptool.a121._core.entities.containers.result import ResultContext
+
+    return a121.Result(
+        data_saturated=data_saturated,
+        frame_delayed=frame_delayed,
+        calibration_needed=calibration_needed,
+        temperature=temperature,
+        frame=frame,
+        tick=tick,
+        context=ResultContext(metadata=metadata, ticks_per_second=ticks_per_second),
+    )
+
+
+def _as_extended(session_config: a121.SessionConfig, value):
+    # non-extended sessions use a single Metadata/Result instead of list[dict[int, ...]]
+    if session_config.extended:
+        return value
+    return [{session_config.sensor_id: value}]
+
+
+def _frame_words(frame: np.ndarray) -> np.ndarray:
+    # int16 real/imag pairs viewed as uint32 words; numpy copies structured
+    # arrays field by field, which is an order of magnitude slower
+    return frame.view("<u4")
+
+
+def to_complex(
+    raw: np.ndarray,
+    dtype: npt.DTypeLike = np.complex64,
+    out: npt.NDArray[np.complexfloating] | None = None,
+) -> npt.NDArray[np.complexfloating]:
+    # int16 real/imag pairs as complex numbers (into `out` if given). complex64
+    # holds every int16 value exactly at half the size of result.frame (complex128)
+    if out is None:
+        out = np.empty(raw.shape, dtype=dtype)
+    try:
+        # both viewed as interleaved real, imag numbers: one converting copy
+        np.copyto(out.view(out.real.dtype), raw.view("<i2"))
+    except ValueError:
+        # the last axis of one of them is not contiguous
+        out.real = raw["real"]
+        out.imag = raw["imag"]
+    return out
+
+
+def _fill_record(record, session_config: a121.SessionConfig, result) -> None:
+    # copies the result of one get_next() call into a record of _record_dtype
+    for group_idx, group in enumerate(_as_extended(session_config, result)):
+        for sensor_id, entry_result in group.items():
+            entry = record[_entry_name(group_idx, sensor_id)]
+            entry["tick"] = entry_result.tick
+            entry["temperature"] = entry_result.temperature
+            entry["data_saturated"] = entry_result.data_saturated
+            entry["frame_delayed"] = entry_result.frame_delayed
+            entry["calibration_needed"] = entry_result.calibration_needed
+            _frame_words(entry["frame"])[...] = _frame_words(entry_result._frame)
+
+
+def _record_result(
+    record,
+    session_config: a121.SessionConfig,
+    extended_metadata: list[dict[int, a121.Metadata]],
+    ticks_per_second: int,
+    tick_offset: int = 0,
+):
+    # a record of _record_dtype as a121.Result objects, shaped like client.get_next().
+    # The frames are copied, so the record may be overwritten afterwards
+    extended_result = []
+    for group_idx, group in enumerate(extended_metadata):
+        group_result = {}
+        for sensor_id, metadata in group.items():
+            entry = record[_entry_name(group_idx, sensor_id)]
+            group_result[sensor_id] = make_result(
+                _frame_words(entry["frame"]).copy().view(INT16_COMPLEX),
+                metadata,
+                ticks_per_second,
+                tick=entry["tick"] + tick_offset,
+                temperature=entry["temperature"],
+                data_saturated=entry["data_saturated"],
+                frame_delayed=entry["frame_delayed"],
+                calibration_needed=entry["calibration_needed"],
+            )
+        extended_result.append(group_result)
+
+    if session_config.extended:
+        return extended_result
+    return extended_result[0][session_config.sensor_id]
+
+
+class Recorder:
+    # Appends results to a recording file. The header is written on creation,
+    # after that each write() appends one fixed-size record, so a recording cut
+    # short (crash, unplugged sensor) is still readable up to the last full record.
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        session_config: a121.SessionConfig,
+        metadata,
+        server_info: a121.ServerInfo,
+    ) -> None:
+        self.session_config = session_config
+        self.extended_metadata = _as_extended(session_config, metadata)
+        self.num_records = 0
+
+        header = {
+            "session_config": json.loads(session_config.to_json()),
+            "metadata": [
+                {str(sensor_id): json.loads(m.to_json()) for sensor_id, m in group.items()}
+                for group in self.extended_metadata
+            ],
+            "server_info": json.loads(server_info.to_json()),
+            "ticks_per_second": server_info.ticks_per_second,
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_offset = -(-(_PREAMBLE.size + len(header_bytes)) // _DATA_ALIGNMENT) * _DATA_ALIGNMENT
+
+        self._record = np.zeros(1, dtype=_record_dtype(self.extended_metadata))
+        self._file = open(path, "wb")
+        self._file.write(_PREAMBLE.pack(MAGIC, VERSION, data_offset))
+        self._file.write(header_bytes.ljust(data_offset - _PREAMBLE.size))
+
+    def write(self, result) -> None:
+        _fill_record(self._record[0], self.session_config, result)
+        self._record.tofile(self._file)
+        self.num_records += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> Recorder:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class Recording:
+    # Read-only view of a recording file. `data` maps the records with np.memmap,
+    # so opening a recording of any length is instant and nothing is read from
+    # disk until it is accessed.
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, data_offset = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a recording (bad magic {magic!r})")
+            if version != VERSION:
+                raise ValueError(f"{path} has unsupported format version {version}")
+            header = json.loads(f.read(data_offset - _PREAMBLE.size))
+
+        self.session_config = a121.SessionConfig.from_json(json.dumps(header["session_config"]))
+        self.extended_metadata = [
+            {int(sensor_id): a121.Metadata.from_json(json.dumps(m)) for sensor_id, m in group.items()}
+            for group in header["metadata"]
+        ]
+        self.server_info = a121.ServerInfo.from_json(json.dumps(header["server_info"]))
+        self.ticks_per_second = header["ticks_per_second"]
+
+        dtype = _record_dtype(self.extended_metadata)
+        num_records = (os.path.getsize(path) - data_offset) // dtype.itemsize
+        if num_records > 0:
+            self.data = np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(num_records,))
+        else:
+            self.data = np.zeros(0, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def metadata(self):
+        # same shape as the return value of client.setup_session()
+        if self.session_config.extended:
+            return self.extended_metadata
+        return self.extended_metadata[0][self.session_config.sensor_id]
+
+    def entry(self, group_idx: int = 0, sensor_id: int = 1) -> np.ndarray:
+        # structured view with the fields tick, temperature, data_saturated,
+        # frame_delayed, calibration_needed and frame for every record
+        return self.data[_entry_name(group_idx, sensor_id)]
+
+    def ticks(self, group_idx: int = 0, sensor_id: int = 1) -> np.ndarray:
+        return self.entry(group_idx, sensor_id)["tick"]
+
+    def raw_frames(self, group_idx: int = 0, sensor_id: int = 1) -> np.ndarray:
+        # (records, sweeps, points) int16 real/imag pairs, zero-copy
+        return self.entry(group_idx, sensor_id)["frame"]
+
+    def frames(
+        self,
+        group_idx: int = 0,
+        sensor_id: int = 1,
+        start: int = 0,
+        stop: int | None = None,
+        dtype: npt.DTypeLike = np.complex128,
+    ) -> npt.NDArray[np.complexfloating]:
+        # (records, sweeps, points) complex frames like result.frame, for records[start:stop].
+        # This converts (and therefore copies) the selected records.
+        return to_complex(self.raw_frames(group_idx, sensor_id)[start:stop], dtype)
+
+    def result(self, index: int, tick_offset: int = 0):
+        # the record at `index` as a121.Result objects, shaped like client.get_next().
+        # tick_offset is added to the recorded ticks (used when replaying in a loop)
+        return _record_result(
+            self.data[index], self.session_config, self.extended_metadata, self.ticks_per_second, tick_offset
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="print a summary of a recording file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    recording = Recording(args.path)
+    print(recording.session_config)
+    print(f"{len(recording)} records")
+    for group_idx, group in enumerate(recording.extended_metadata):
+        for sensor_id in group:
+            entry = recording.entry(group_idx, sensor_id)
+            if len(entry) == 0:
+                continue
+            ticks = entry["tick"]
+            print(
+                f"group {group_idx} sensor {sensor_id}: frames {entry['frame'].shape[1:]}, "
+                f"ticks {ticks[0]}..{ticks[-1]}, "
+                f"{np.count_nonzero(entry['frame_delayed'])} delayed, "
+                f"{np.count_nonzero(entry['data_saturated'])} saturated"
+            )
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from heatmap_renderer import HeatmapRenderer
+
+
+def save_heatmap(i, distance_velocity_map, x_axis_label, y_axis_label, directory='./range_velocity_map'):
+    plt.figure(figsize=(12, 8))
+
+    plt.imshow(distance_velocity_map, aspect='auto', origin='lower', cmap='hot', interpolation='nearest',
+       extent=[x_axis_label[0], x_axis_label[-1], y_axis_label[0], y_axis_label[-1]])
+    plt.colorbar(label='Magnitude (dB)')
+    plt.xlabel('Range (m)')
+    plt.ylabel('Velocity (m/s)')
+    plt.title(f'range-doppler heatmap (results {i})')
+    plt.tight_layout()
+    plt.savefig(f'{directory}/results{i}.png')
+    plt.close()
+
+
+def _init_worker():
+    # workers only write files, never open windows
+    plt.switch_backend('Agg')
+
+
+# one reusable figure per process, rebuilt only when the axes change
+_renderer = None
+_renderer_key = None
+
+
+def _get_renderer(x_axis_label, y_axis_label, shape, directory):
+    global _renderer, _renderer_key
+    key = (tuple(np.asarray(x_axis_label).tolist()), tuple(np.asarray(y_axis_label).tolist()), shape, directory)
+    if key != _renderer_key:
+        _renderer = HeatmapRenderer(x_axis_label, y_axis_label, shape, directory)
+        _renderer_key = key
+    return _renderer
+
+
+def _render_chunk(task):
+    first, distance_velocity_maps, x_axis_label, y_axis_label, directory = task
+    renderer = _get_renderer(x_axis_label, y_axis_label, distance_velocity_maps.shape[1:], directory)
+    for i, distance_velocity_map in enumerate(distance_velocity_maps, start=first):
+        renderer.render(i, distance_velocity_map)
+    return len(distance_velocity_maps)
+
+
+class HeatmapRenderPool:
+    # Writes range_velocity_map/results{i}.png from worker processes.
+    # Maps are submitted in batches, split into chunks of `chunk_size` frames,
+    # and each chunk is rendered by one worker. workers=None uses all cores,
+    # workers=0 renders in this process (useful as a serial baseline).
+    #
+    # Scripts using this must guard their entry point with
+    # `if __name__ == "__main__":`, since workers re-import the main module
+    # on platforms that spawn processes (Windows, macOS).
+    def __init__(self, workers: int | None = None, chunk_size: int = 8, directory='./range_velocity_map') -> None:
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.directory = directory
+        self.pool = mp.Pool(self.workers, initializer=_init_worker) if self.workers > 0 else None
+        self.pending = []
+        self.num_images = 0
+        self.start = None
+        self.elapsed = 0.0
+
+    def submit(self, first, distance_velocity_maps, x_axis_label, y_axis_label) -> None:
+        if self.start is None:
+            self.start = time.perf_counter()
+        for offset in range(0, len(distance_velocity_maps), self.chunk_size):
+            task = (
+                first + offset,
+                distance_velocity_maps[offset : offset + self.chunk_size],
+                x_axis_label,
+                y_axis_label,
+                self.directory,
+            )
+            if self.pool is None:
+                self.num_images += _render_chunk(task)
+            else:
+                self.pending.append(self.pool.apply_async(_render_chunk, (task,)))
+
+    def close(self) -> None:
+        # waits for all submitted images to be written
+        if self.pool is not None:
+            self.pool.close()
+            for pending in self.pending:
+                self.num_images += pending.get()
+            self.pool.join()
+            self.pending = []
+        if self.start is not None:
+            self.elapsed = time.perf_counter() - self.start
+
+    def __enter__(self) -> HeatmapRenderPool:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None and self.pool is not None:
+            self.pool.terminate()
+            return
+        self.close()
+
+    def summary(self) -> str:
+        rate = self.num_images / self.elapsed if self.elapsed > 0 else 0.0
+        return f'{self.num_images} images in {self.elapsed:.2f} s with {self.workers} workers ({rate:.1f} images/s)'
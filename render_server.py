@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from heatmap_renderer import HeatmapRenderer
+from map_store import MapStore, map_key
+from recording import Recording, _entry_name, to_complex
+
+# The server only listens locally by default; it has no authentication
+HOST = "127.0.0.1"
+PORT = 8125
+
+# rendered PNGs are kept up to this many bytes in total, least recently used first out
+CACHE_BYTES = 64 << 20
+DPI = 100
+
+# views: "map" from a map store (or computed from a recording), "iq" and "magphase" from a recording
+VIEWS = ("map", "iq", "magphase")
+_PATH = re.compile(r"^/(?P<view>\w+)/(?P<key>\w+)\.png$")
+_MAP_KEY = re.compile(r"^g(\d+)_s(\d+)_sub(\d+)$")
+_ENTRY_KEY = re.compile(r"^g(\d+)_s(\d+)$")
+
+
+class ImageCache:
+    # LRU cache of rendered images, limited by their total size in bytes
+    def __init__(self, max_bytes: int = CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.num_bytes -= len(old)
+            self._images[key] = image
+            self.num_bytes += len(image)
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.num_bytes -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def stats(self) -> dict:
+        return {
+            "images": len(self._images),
+            "bytes": self.num_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def summary(self) -> str:
+        requests = self.hits + self.misses
+        hit_rate = self.hits / requests if requests else 0.0
+        return (
+            f"{len(self._images)} images cached ({self.num_bytes / 1e6:.1f} of {self.max_bytes / 1e6:.1f} MB), "
+            f"{self.hits}/{requests} hits ({hit_rate:.0%})"
+        )
+
+
+class IQRenderer:
+    # I and Q heatmaps (sweep x distance point) and the I/Q scatter plot of one
+    # frame, like basic_plot.custom_graph, built once per frame shape
+    def __init__(self, shape) -> None:
+        self.fig = Figure(figsize=(15, 5))
+        FigureCanvasAgg(self.fig)
+        ax_i, ax_q, ax_iq = self.fig.subplots(1, 3)
+        self.images = []
+        for ax, title, cmap in ((ax_i, "Real(I) heatmap", "viridis"), (ax_q, "Imaginary(Q) heatmap", "plasma")):
+            image = ax.imshow(np.zeros(shape), aspect="auto", origin="lower", cmap=cmap, interpolation="nearest")
+            self.fig.colorbar(image, ax=ax, label="Amplitude")
+            ax.set_title(title)
+            ax.set_xlabel("distance point")
+            ax.set_ylabel("sweep")
+            self.images.append(image)
+        self.scatter = ax_iq.scatter(np.zeros(shape[0] * shape[1]), np.zeros(shape[0] * shape[1]), s=8, alpha=0.7)
+        ax_iq.grid(True)
+        ax_iq.axhline(y=0, color="k", alpha=0.3)
+        ax_iq.axvline(x=0, color="k", alpha=0.3)
+        ax_iq.set_xlabel("Real part(I)")
+        ax_iq.set_ylabel("Imaginary part(Q)")
+        self.ax_iq = ax_iq
+        self.title = self.fig.suptitle("")
+        # room for the title (frame and tick) above the panels
+        self.fig.tight_layout(rect=(0, 0, 1, 0.95))
+
+    def render(self, title, frame, out) -> None:
+        for image, values in zip(self.images, (frame.real, frame.imag)):
+            image.set_data(values)
+            image.set_clim(np.min(values), np.max(values))
+        self.scatter.set_offsets(np.column_stack([frame.real.ravel(), frame.imag.ravel()]))
+        # symmetric limits, so the origin stays in the middle
+        limit = max(float(np.max(np.abs(frame.real))), float(np.max(np.abs(frame.imag))), 1.0) * 1.05
+        self.ax_iq.set_xlim(-limit, limit)
+        self.ax_iq.set_ylim(-limit, limit)
+        self.title.set_text(title)
+        self.fig.savefig(out, format="png", dpi=DPI)
+
+
+class MagnitudePhaseRenderer:
+    # magnitude and phase of every sweep over the distance points, like the
+    # magnitude_phase.png of basic_plot.custom_graph, built once per frame shape
+    def __init__(self, shape) -> None:
+        num_sweeps, num_points = shape
+        self.fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(self.fig)
+        self.axes = self.fig.subplots(2, 1)
+        x = np.arange(num_points)
+        self.lines = []
+        for ax, title, label in zip(self.axes, ("signal amplitude(abs)", "signal phase"), ("Amplitude", "phase(degree)")):
+            self.lines.append(ax.plot(x, np.zeros((num_points, num_sweeps)), "o-", markersize=3))
+            ax.grid(True)
+            ax.set_title(title)
+            ax.set_xlabel("distance point")
+            ax.set_ylabel(label)
+        self.axes[1].set_ylim(-185, 185)
+        self.title = self.fig.suptitle("")
+        self.fig.tight_layout(rect=(0, 0, 1, 0.95))
+
+    def render(self, title, frame, out) -> None:
+        for line, values in zip(self.lines[0], np.abs(frame)):
+            line.set_ydata(values)
+        for line, values in zip(self.lines[1], np.angle(frame, deg=True)):
+            line.set_ydata(values)
+        self.axes[0].relim()
+        self.axes[0].autoscale_view()
+        self.title.set_text(title)
+        self.fig.savefig(out, format="png", dpi=DPI)
+
+
+class RenderService:
+    # Renders the views of a map store and/or recording as PNG on request and
+    # keeps them in an ImageCache. One figure per (view, key) is built on first
+    # use and reused; figures and files are shared, so rendering is serialized
+    # by a lock while cache hits are served without it.
+    def __init__(self, maps: MapStore | None = None, recording: Recording | None = None, cache_bytes: int = CACHE_BYTES) -> None:
+        if maps is None and recording is None:
+            raise ValueError("nothing to serve, give a map store and/or a recording")
+        self.maps = maps
+        self.recording = recording
+        self.cache = ImageCache(cache_bytes)
+        self.render_time = 0.0
+        self.num_rendered = 0
+        self._renderers = {}
+        self._engines = {}
+        self._lock = threading.Lock()
+        # maps computed from the recording use the unit of the stored ones, so a
+        # key shows the same values with or without a map store (linear without one,
+        # as sparse_iq_copy.py stores them)
+        self.db = maps.db if maps is not None else False
+
+    def keys(self) -> dict[str, dict[str, int]]:
+        # {view: {key: number of frames}}
+        keys = {view: {} for view in VIEWS}
+        if self.maps is not None:
+            keys["map"] = {key: self.maps.num_maps(key) for key in self.maps.keys}
+        if self.recording is not None:
+            for group_idx, group in enumerate(self.recording.extended_metadata):
+                for sensor_id, metadata in group.items():
+                    for view in ("iq", "magphase"):
+                        keys[view][_entry_name(group_idx, sensor_id)] = len(self.recording)
+                    for subsweep_idx in range(len(metadata.subsweep_data_offset)):
+                        keys["map"].setdefault(map_key(group_idx, sensor_id, subsweep_idx), len(self.recording))
+        return keys
+
+    def ticks(self, view: str, key: str) -> np.ndarray:
+        if view == "map" and self.maps is not None and key in self.maps.keys:
+            return self.maps.ticks(key)
+        group_idx, sensor_id = self._entry(view, key)[:2]
+        return self.recording.ticks(group_idx, sensor_id)
+
+    def index(self, view: str, key: str, tick: int) -> int:
+        # index of the frame with this tick, or the last one before it
+        i = int(np.searchsorted(self.ticks(view, key), tick, side="right")) - 1
+        if i < 0:
+            raise IndexError(f"no {view} {key} frame at or before tick {tick}")
+        return i
+
+    def render(self, view: str, key: str, index: int) -> bytes:
+        num_frames = self.keys()[view].get(key)
+        if num_frames is None:
+            raise KeyError(f"no {view} {key}")
+        if index < 0:
+            index += num_frames
+        if not 0 <= index < num_frames:
+            raise IndexError(f"{view} {key} has {num_frames} frames, no frame {index}")
+
+        image = self.cache.get((view, key, index))
+        if image is not None:
+            return image
+        with self._lock:
+            start = time.perf_counter()
+            out = io.BytesIO()
+            if view == "map":
+                self._render_map(key, index, out)
+            else:
+                self._render_frame(view, key, index, out)
+            self.render_time += time.perf_counter() - start
+            self.num_rendered += 1
+        image = out.getvalue()
+        self.cache.put((view, key, index), image)
+        return image
+
+    def _entry(self, view: str, key: str):
+        # (group, sensor[, subsweep]) of a recording key
+        match = (_MAP_KEY if view == "map" else _ENTRY_KEY).match(key)
+        if self.recording is None or match is None:
+            raise KeyError(f"no {view} {key}")
+        return tuple(int(part) for part in match.groups())
+
+    def _render_map(self, key: str, index: int, out) -> None:
+        if self.maps is not None and key in self.maps.keys:
+            distance_velocity_map = self.maps.map(key, index)
+            if ("map", key) not in self._renderers:
+                self._renderers[("map", key)] = self.maps.renderer(key)
+        else:
+            # not stored: computed from the raw frame, like sparse_iq_copy.py would have
+            distance_velocity_map = self._compute_map(key, index)
+        self._renderers[("map", key)].render(index, distance_velocity_map, out)
+
+    def _compute_map(self, key: str, index: int) -> np.ndarray:
+        from range_doppler import RangeDopplerEngine
+        from session_axes import SessionAxes
+
+        group_idx, sensor_id, subsweep_idx = self._entry("map", key)
+        metadata = self.recording.extended_metadata[group_idx][sensor_id]
+        offset = int(metadata.subsweep_data_offset[subsweep_idx])
+        columns = slice(offset, offset + int(metadata.subsweep_data_length[subsweep_idx]))
+        raw = self.recording.raw_frames(group_idx, sensor_id)[index][:, columns]
+        if key not in self._engines:
+            self._engines[key] = RangeDopplerEngine(raw.shape[0])
+            session_axes = SessionAxes(self.recording.session_config, self.recording.extended_metadata)
+            self._renderers[("map", key)] = HeatmapRenderer(
+                session_axes.distances(group_idx, sensor_id, subsweep_idx),
+                session_axes.velocities(group_idx, sensor_id),
+                raw.shape,
+                label="Magnitude (dB)" if self.db else "Magnitude",
+            )
+        return self._engines[key].process(raw, db=self.db)
+
+    def _render_frame(self, view: str, key: str, index: int, out) -> None:
+        group_idx, sensor_id = self._entry(view, key)
+        frame = to_complex(self.recording.raw_frames(group_idx, sensor_id)[index])
+        if (view, key) not in self._renderers:
+            renderer_class = IQRenderer if view == "iq" else MagnitudePhaseRenderer
+            self._renderers[(view, key)] = renderer_class(frame.shape)
+        tick = self.recording.ticks(group_idx, sensor_id)[index]
+        self._renderers[(view, key)].render(f"{key} frame {index} (tick {tick})", frame, out)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "rendered": self.num_rendered,
+            "render_ms": 1000 * self.render_time / self.num_rendered if self.num_rendered else 0.0,
+        }
+
+
+# a single page to browse the views: pick a view and key, step through the frames
+_INDEX_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>xm125 render server</title></head>
+<body style="font-family: sans-serif">
+<select id="key"></select>
+<button onclick="step(-1)">&lt;</button>
+<input id="index" type="number" value="0" min="0" style="width: 6em" onchange="show()">
+<button onclick="step(1)">&gt;</button>
+<span id="count"></span><br>
+<img id="image">
+<script>
+const keys = %s;
+const select = document.getElementById("key"), input = document.getElementById("index");
+for (const [view, entries] of Object.entries(keys))
+  for (const [key, count] of Object.entries(entries))
+    select.add(new Option(`${view} ${key}`, JSON.stringify([view, key, count])));
+select.onchange = show;
+function step(n) { input.value = Math.max(0, +input.value + n); show(); }
+function show() {
+  const [view, key, count] = JSON.parse(select.value);
+  input.max = count - 1;
+  document.getElementById("count").textContent = `of ${count}`;
+  document.getElementById("image").src = `/${view}/${key}.png?index=${input.value}`;
+}
+document.onkeydown = (e) => { if (e.key == "ArrowLeft") step(-1); if (e.key == "ArrowRight") step(1); };
+if (select.options.length) show();
+</script></body></html>
+"""
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    # GET /                               browsing page
+    # GET /<view>/<key>.png?index=N       frame N (negative counts from the end)
+    # GET /<view>/<key>.png?tick=T        frame at tick T (or the last one before it)
+    # GET /keys, /stats                   JSON
+    service: RenderService
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/":
+            return self._send(200, "text/html; charset=utf-8", (_INDEX_PAGE % json.dumps(self.service.keys())).encode())
+        if url.path == "/keys":
+            return self._send_json(self.service.keys())
+        if url.path == "/stats":
+            return self._send_json(self.service.stats())
+
+        match = _PATH.match(url.path)
+        if match is None or match["view"] not in VIEWS:
+            return self._send(404, "text/plain", f"unknown path {url.path}, views are {', '.join(VIEWS)}".encode())
+        view, key = match["view"], match["key"]
+        try:
+            if "tick" in query:
+                index = self.service.index(view, key, int(query["tick"][0]))
+            else:
+                index = int(query.get("index", ["0"])[0])
+            image = self.service.render(view, key, index)
+        except KeyError as e:
+            return self._send(404, "text/plain", str(e).strip("'").encode())
+        except (IndexError, ValueError) as e:
+            return self._send(400, "text/plain", str(e).encode())
+        self._send(200, "image/png", image)
+
+    def _send_json(self, value) -> None:
+        self._send(200, "application/json", json.dumps(value).encode())
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # every image request would be logged otherwise
+        pass
+
+
+def make_server(service: RenderService, host: str = HOST, port: int = PORT) -> ThreadingHTTPServer:
+    handler = type("Handler", (RenderRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def benchmark(num_frames=200, num_requests=400, num_sweeps=10, num_points=100):
+    # browsing a synthetic map store back and forth: rendering on a cache miss
+    # vs serving a cached image, over HTTP
+    from urllib.request import urlopen
+
+    from map_store import MapWriter
+
+    rng = np.random.default_rng(0)
+    key = map_key(0, 1, 0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "maps.xmm")
+        axes = (np.linspace(0.2, 0.45, num_points), np.linspace(-1.0, 1.0, num_sweeps))
+        with MapWriter(path, {key: axes}, db=True) as writer:
+            for i in range(num_frames):
+                writer.append(key, i, rng.normal(60.0, 5.0, (num_sweeps, num_points)))
+
+        with MapStore(path) as store:
+            service = RenderService(store)
+            server = make_server(service, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://{HOST}:{server.server_address[1]}/map/{key}.png"
+            # a random walk over the frames, as when stepping through a session
+            indices = np.clip(np.cumsum(rng.choice([-1, 1], num_requests)), 0, num_frames - 1)
+            start = time.perf_counter()
+            for i in indices:
+                urlopen(f"{url}?index={i}").read()
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            server.server_close()
+
+    stats = service.stats()
+    print(f"{num_requests} requests over {num_frames} maps of {num_sweeps} x {num_points}")
+    print(f"rendered {stats['rendered']} maps at {stats['render_ms']:.1f} ms each, {service.cache.summary()}")
+    print(f"mean request time {elapsed / num_requests * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve heatmaps and I/Q plots of stored frames over HTTP")
+    parser.add_argument("--maps", metavar="PATH", help="map store written by sparse_iq_copy.py (see map_store.py)")
+    parser.add_argument("--recording", metavar="PATH", help="recording file (see recording.py)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache-mb", type=float, default=CACHE_BYTES / (1 << 20), help="size limit of the image cache")
+    parser.add_argument("--benchmark", action="store_true", help="run the benchmark instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        raise SystemExit
+
+    maps = MapStore(args.maps) if args.maps else None
+    recording = Recording(args.recording) if args.recording else None
+    try:
+        service = RenderService(maps, recording, int(args.cache_mb * (1 << 20)))
+    except ValueError as e:
+        parser.error(str(e))
+    server = make_server(service, args.host, args.port)
+    print(f"serving on http://{args.host}:{server.server_address[1]}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(service.cache.summary())
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import time
+
+from acconeer.exptool import a121
+
+from recording import Recording
+
+# Setting XM125_REPLAY=<recording file> makes open_client() return a ReplayClient
+# instead of connecting to the sensor, so the scripts run without hardware.
+# XM125_REPLAY_MODE is "fast" (default, as fast as possible) or "realtime".
+REPLAY_ENV = "XM125_REPLAY"
+REPLAY_MODE_ENV = "XM125_REPLAY_MODE"
+
+
+class ReplayExhaustedError(Exception):
+    pass
+
+
+class ReplayClient:
+    # Stands in for a121.Client, serving the results of a recording (see recording.py).
+    #
+    # mode="fast" returns results as fast as get_next() is called, for throughput
+    # measurements. mode="realtime" waits until each result's tick (relative to
+    # the first one) has passed on the host clock, like a real sensor would.
+    # With loop=True the recording restarts when it runs out, with ticks
+    # continuing to increase; otherwise get_next() raises ReplayExhaustedError.
+    def __init__(self, path, mode: str = "fast", loop: bool = False) -> None:
+        if mode not in ("fast", "realtime"):
+            raise ValueError(f"unknown replay mode {mode!r}, expected 'fast' or 'realtime'")
+
+        self.recording = Recording(path)
+        if len(self.recording) == 0:
+            raise ValueError(f"{path} contains no results")
+        self.mode = mode
+        self.loop = loop
+        self.session_config = None
+        self._session_started = False
+
+        # timing follows the first sensor of the first group
+        sensor_id = next(iter(self.recording.extended_metadata[0]))
+        ticks = self._ticks = self.recording.ticks(0, sensor_id)
+        self._first_tick = int(ticks[0])
+        # one extra frame period so the first result of the next loop does not share a tick
+        frame_period = int(ticks[1] - ticks[0]) if len(ticks) > 1 else 1
+        self._loop_span = int(ticks[-1] - ticks[0]) + frame_period
+
+    @property
+    def server_info(self) -> a121.ServerInfo:
+        return self.recording.server_info
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    def setup_session(self, config):
+        if isinstance(config, a121.SensorConfig):
+            config = a121.SessionConfig(config)
+        if config != self.recording.session_config:
+            raise ValueError(
+                f"session config does not match the one in {self.recording.path}:\n"
+                f"{self.recording.session_config}"
+            )
+        self.session_config = config
+        return self.recording.metadata
+
+    def start_session(self) -> None:
+        if self.session_config is None:
+            raise RuntimeError("setup_session() must be called before start_session()")
+        self._index = 0
+        self._tick_offset = 0
+        self._start_time = time.perf_counter()
+        self._session_started = True
+
+    def get_next(self):
+        if not self._session_started:
+            raise RuntimeError("start_session() must be called before get_next()")
+
+        if self._index == len(self.recording):
+            if not self.loop:
+                raise ReplayExhaustedError(f"all {len(self.recording)} results of {self.recording.path} have been replayed")
+            self._index = 0
+            self._tick_offset += self._loop_span
+
+        if self.mode == "realtime":
+            tick = int(self._ticks[self._index]) + self._tick_offset
+            due = self._start_time + (tick - self._first_tick) / self.recording.ticks_per_second
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        result = self.recording.result(self._index, self._tick_offset)
+        self._index += 1
+        return result
+
+    def stop_session(self) -> None:
+        self._session_started = False
+
+    def close(self) -> None:
+        self._session_started = False
+
+
+def open_client(**kwargs):
+    # a121.Client.open(**kwargs), unless XM125_REPLAY points at a recording
+    path = os.environ.get(REPLAY_ENV)
+    if not path:
+        return a121.Client.open(**kwargs)
+
+    mode = os.environ.get(REPLAY_MODE_ENV, "fast")
+    print(f"Replaying {path} ({mode}) instead of connecting to the sensor")
+    # the scripts run until Ctrl-C, so keep replaying the recording
+    return ReplayClient(path, mode=mode, loop=True)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+
+from recording import _frame_words, to_complex
+
+
+class FrameRingBuffer:
+    # Fixed-capacity store for the last `capacity` frames of one sensor.
+    # All memory is allocated up front, so acquisition runs at constant memory
+    # no matter how long the session is; old frames are overwritten in place.
+    #
+    # With dtype=recording.INT16_COMPLEX frames are kept in the wire format
+    # (4 bytes per point instead of 16 for complex128) and get(), latest() and
+    # iter_frames() return raw frames; convert them with recording.to_complex
+    # where complex math is needed (RangeDopplerEngine takes them as they are).
+    def __init__(
+        self,
+        capacity: int,
+        sweeps_per_frame: int,
+        num_points: int,
+        dtype: npt.DTypeLike = np.complex128,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, sweeps_per_frame, num_points), dtype=dtype)
+        self.ticks = np.zeros(capacity, dtype=np.int64)
+        # total number of frames ever pushed (not wrapped)
+        self.count = 0
+
+    @classmethod
+    def from_sensor_config(
+        cls,
+        sensor_config,
+        capacity: int,
+        dtype: npt.DTypeLike = np.complex128,
+    ) -> FrameRingBuffer:
+        return cls(capacity, sensor_config.sweeps_per_frame, sensor_config.num_points, dtype)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def raw(self) -> bool:
+        # frames are stored as int16 real/imag pairs
+        return self.frames.dtype.names is not None
+
+    @property
+    def dropped(self) -> int:
+        # frames that have been overwritten before anyone read them out
+        return max(0, self.count - self.capacity)
+
+    @property
+    def first_index(self) -> int:
+        # absolute index of the oldest frame still in the buffer
+        return self.count - len(self)
+
+    def push(self, frame: npt.NDArray, tick: int = 0) -> int:
+        # Copies `frame` into the next slot and returns its absolute index.
+        # `frame` is either a complex array or the raw wire format
+        # (dtype=[('real', '<i2'), ('imag', '<i2')]) as found in result._frame,
+        # which is copied without building an intermediate complex array.
+        # A raw buffer only takes raw frames.
+        slot = self.count % self.capacity
+        dst = self.frames[slot]
+        if self.raw:
+            if frame.dtype.names is None:
+                raise TypeError(f"a raw frame buffer only takes raw int16 frames, got {frame.dtype}")
+            _frame_words(dst)[...] = _frame_words(frame)
+        elif frame.dtype.names is not None:
+            to_complex(frame, out=dst)
+        else:
+            dst[...] = frame
+        self.ticks[slot] = tick
+        self.count += 1
+        return self.count - 1
+
+    def push_result(self, result) -> int:
+        return self.push(result._frame, result.tick)
+
+    def get(self, index: int) -> npt.NDArray:
+        # Returns a view of the frame with absolute index `index`.
+        # The view is only valid until the slot is overwritten.
+        if not self.first_index <= index < self.count:
+            raise IndexError(
+                f"frame {index} is not in the buffer (holding {self.first_index}..{self.count - 1})"
+            )
+        return self.frames[index % self.capacity]
+
+    def iter_frames(self):
+        # oldest to newest, yields (absolute index, tick, frame view)
+        for index in range(self.first_index, self.count):
+            slot = index % self.capacity
+            yield index, int(self.ticks[slot]), self.frames[slot]
+
+    def latest(self, n: int = 1) -> npt.NDArray:
+        # Returns the last `n` frames in acquisition order as one array.
+        # This is a view when the frames are contiguous in memory and a copy
+        # when they wrap around the end of the buffer.
+        n = min(n, len(self))
+        end = self.count % self.capacity or self.capacity
+        if n <= end:
+            return self.frames[end - n : end]
+        return np.concatenate((self.frames[self.capacity - (n - end) :], self.frames[:end]))
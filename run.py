@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+
+from profiles import available_profiles, load_profile
+
+# pipeline name -> module with main(profile) and a default PROFILE
+PIPELINES = {
+    "range_doppler": "faster_range_doppler",
+    "sparse_iq": "sparse_iq_copy",
+    "plot": "plot",
+    "live_range_doppler": "live_range_doppler",
+}
+
+
+def main():
+    # Runs any pipeline with any profile, e.g.
+    #   python run.py range_doppler --profile plot --set sweeps_per_frame=32
+    # Arguments the runner does not know are passed on to the pipeline.
+    parser = argparse.ArgumentParser(description="run a pipeline with a session profile")
+    parser.add_argument("pipeline", nargs="?", choices=sorted(PIPELINES))
+    parser.add_argument("--profile", help="profile name in profiles/ or path to a .toml/.json file "
+                        "(default: the pipeline's own)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a profile parameter, see profiles.py (may be repeated)")
+    parser.add_argument("--list", action="store_true", help="list the profiles and exit")
+    args, pipeline_args = parser.parse_known_args()
+
+    if args.list or args.pipeline is None:
+        for name in available_profiles():
+            try:
+                print(load_profile(name).summary())
+            except ValueError as e:
+                print(e)
+        return
+
+    module = importlib.import_module(PIPELINES[args.pipeline])
+    try:
+        # validated here, before the pipeline connects to a sensor
+        profile = load_profile(args.profile or module.PROFILE, args.overrides)
+    except ValueError as e:
+        parser.error(str(e))
+    print(profile.summary())
+
+    sys.argv = [module.__file__] + pipeline_args
+    module.main(profile)
+
+
+if __name__ == "__main__":
+    main()
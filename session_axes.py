@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+
+# distance between two distance points with step_length=1
+POINT_SPACING_M = 2.5e-3
+
+
+def get_distances_m(config) -> npt.NDArray[np.float64]:
+    # distance (m) of each distance point of a subsweep (or single subsweep sensor) config
+    range_p = np.arange(config.num_points) * config.step_length + config.start_point
+    return range_p * POINT_SPACING_M
+
+
+def get_velocity_axis(config, max_sweep_rate) -> npt.NDArray[np.float64]:
+    # velocity (m/s) of each row of the distance velocity map of a sensor config
+    #c=299792458
+    wavelength = 299792458.0 / 6e+10 / 2
+
+    if config.sweep_rate is not None:
+        sweep_rate = config.sweep_rate
+    else:
+        sweep_rate = max_sweep_rate
+
+    sweep_period = 1.0/sweep_rate
+
+    v_max = wavelength / (4*sweep_period)
+    return np.linspace(-v_max, v_max, config.sweeps_per_frame)
+
+
+class SessionAxes:
+    # Distance and velocity axes of every (group, sensor, subsweep) in a session.
+    # They only depend on the session config and the max_sweep_rate of the
+    # metadata, so they are computed once and returned as read-only arrays.
+    # set_session() recomputes them only if the config or metadata changed.
+    def __init__(self, session_config, extended_metadata) -> None:
+        self._key = None
+        self.set_session(session_config, extended_metadata)
+
+    def set_session(self, session_config, extended_metadata) -> None:
+        if not isinstance(extended_metadata, list):
+            extended_metadata = [{session_config.sensor_id: extended_metadata}]
+
+        max_sweep_rates = tuple(
+            (group_idx, sensor_id, metadata.max_sweep_rate)
+            for group_idx, group in enumerate(extended_metadata)
+            for sensor_id, metadata in group.items()
+        )
+        key = (session_config.to_json(), max_sweep_rates)
+        if key == self._key:
+            return
+
+        self._distances = {}
+        self._velocities = {}
+        for group_idx, sensor_id, max_sweep_rate in max_sweep_rates:
+            sensor_config = session_config.groups[group_idx][sensor_id]
+            for sub_idx, subsweep_config in enumerate(sensor_config.subsweeps):
+                self._distances[(group_idx, sensor_id, sub_idx)] = _read_only(
+                    get_distances_m(subsweep_config)
+                )
+            self._velocities[(group_idx, sensor_id)] = _read_only(
+                get_velocity_axis(sensor_config, max_sweep_rate)
+            )
+        self._key = key
+
+    def distances(self, group_idx=0, sensor_id=1, sub_idx=0) -> npt.NDArray[np.float64]:
+        return self._distances[(group_idx, sensor_id, sub_idx)]
+
+    def velocities(self, group_idx=0, sensor_id=1) -> npt.NDArray[np.float64]:
+        return self._velocities[(group_idx, sensor_id)]
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
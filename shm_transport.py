@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import pickle
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from acconeer.exptool import a121
+
+from recording import _as_extended, _fill_record, _record_dtype, _record_result
+
+
+class SharedFrameSender:
+    # Main process side of a shared memory ring for the results of one client.
+    # Each slot is one record of the recording format (tick, flags and the raw
+    # int16 frame of every group/sensor), so send() only copies the frames and
+    # returns a sequence number; that number is all that is sent to the plot
+    # process. Metadata goes over once, inside the pickled receiver.
+    #
+    # The plot process must have finished with a slot before it is reused,
+    # i.e. `slots` must be larger than the number of updates in flight
+    # (DisplayLink.max_in_flight).
+    def __init__(
+        self,
+        session_config: a121.SessionConfig,
+        metadata,
+        ticks_per_second: int,
+        slots: int = 4,
+    ) -> None:
+        self.session_config = session_config
+        self.extended_metadata = _as_extended(session_config, metadata)
+        self.slots = slots
+        dtype = _record_dtype(self.extended_metadata)
+        self.shm = shared_memory.SharedMemory(create=True, size=dtype.itemsize * slots)
+        self.records = np.ndarray(slots, dtype=dtype, buffer=self.shm.buf)
+        self.sequence = 0
+        self.receiver = SharedFrameReceiver(
+            self.shm.name, session_config, self.extended_metadata, ticks_per_second, slots
+        )
+
+    def send(self, result) -> int:
+        sequence = self.sequence
+        _fill_record(self.records[sequence % self.slots], self.session_config, result)
+        self.sequence += 1
+        return sequence
+
+    def close(self) -> None:
+        del self.records
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedFrameReceiver:
+    # Plot process side of a SharedFrameSender, created by it and passed to the
+    # plot process with the updater. attach() must be called there before result().
+    def __init__(self, name, session_config, extended_metadata, ticks_per_second, slots) -> None:
+        self.name = name
+        self.session_config = session_config
+        self.extended_metadata = extended_metadata
+        self.ticks_per_second = ticks_per_second
+        self.slots = slots
+        self.shm = None
+        self.records = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["shm"] = state["records"] = None
+        return state
+
+    def attach(self) -> None:
+        # the sender owns (and unlinks) the memory; since 3.13 the plot process can
+        # also be kept from registering it with its own resource tracker
+        kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+        self.shm = shared_memory.SharedMemory(name=self.name, **kwargs)
+        self.records = np.ndarray(self.slots, dtype=_record_dtype(self.extended_metadata), buffer=self.shm.buf)
+
+    def result(self, sequence: int):
+        # shaped like client.get_next(); the frames are copied out of the ring
+        return _record_result(
+            self.records[sequence % self.slots], self.session_config, self.extended_metadata, self.ticks_per_second
+        )
+
+
+class SharedFrameUpdater:
+    # Wraps an updater that takes {key: result}. It receives {key: sequence
+    # number} (see DisplayLink encode) and reads the results from the ring of
+    # receivers[key].
+    def __init__(self, updater, receivers) -> None:
+        self.updater = updater
+        self.receivers = receivers
+
+    def setup(self, win):
+        for receiver in self.receivers:
+            receiver.attach()
+        self.updater.setup(win)
+
+    def update(self, sequences) -> None:
+        self.updater.update({key: self.receivers[key].result(sequence) for key, sequence in sequences.items()})
+
+
+def benchmark(num_frames=2000, sweeps_per_frame=10, num_points=100):
+    # per-frame cost of sending an extended result to the plot process by pickling
+    # (what PGProcess.put_data does) vs copying it into the ring
+    from benchmark import BenchmarkInput
+
+    data = BenchmarkInput(num_points, sweeps_per_frame, num_frames)
+    extended_results = data.extended_results
+
+    start = time.perf_counter()
+    sizes = [len(pickle.dumps(result)) for result in extended_results]
+    pickle_time = (time.perf_counter() - start) / num_frames
+
+    sender = SharedFrameSender(data.session_config, data.extended_metadata, data.ticks_per_second)
+    try:
+        start = time.perf_counter()
+        message_sizes = [len(pickle.dumps(sender.send(result))) for result in extended_results]
+        shm_time = (time.perf_counter() - start) / num_frames
+
+        # as the plot process gets it
+        receiver = pickle.loads(pickle.dumps(sender.receiver))
+        receiver.attach()
+        start = time.perf_counter()
+        for i in range(num_frames):
+            receiver.result(i)
+        read_time = (time.perf_counter() - start) / num_frames
+        del receiver.records
+        receiver.shm.close()
+    finally:
+        sender.close()
+
+    print(f"{num_frames} frames of {sweeps_per_frame} sweeps x {num_points} points")
+    print(f"pickle:        {pickle_time * 1e6:8.1f} us/frame, {np.mean(sizes):8.0f} bytes/message")
+    print(f"shared memory: {shm_time * 1e6:8.1f} us/frame, {np.mean(message_sizes):8.0f} bytes/message")
+    print(f"ring read:     {read_time * 1e6:8.1f} us/frame (plot process)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare pickling results with the shared memory ring")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--sweeps", type=int, default=10)
+    parser.add_argument("--points", type=int, default=100)
+    args = parser.parse_args()
+    benchmark(args.frames, args.sweeps, args.points)
@@ -5,48 +5,46 @@ from __future__ import annotations
 
 import acconeer.exptool as et
 from acconeer.exptool import a121
-from acconeer.exptool.a121._core.entities.configs.config_enums import PRF, IdleState, Profile
-from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod, Processor, ProcessorConfig
-import matplotlib.pyplot as plt
-import numpy as np
+from replay_client import open_client
+from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod
+import json
+import time
+from streaming import StreamingPipeline
+from map_store import MapWriter, map_key
+from session_axes import SessionAxes
+from recording import Recorder
+from profiles import load_profile
+from sparse_iq_select import SelectiveProcessor, parse_selection
 # sensor config
 #https://docs.acconeer.com/en/latest/exploration_tool/api/a121.html
 
-def get_distance_axis(config,distance_velocity_map):
-    #get distance range
-    start_m=config.start_point * 0.0025
-    step_m = config.step_length * 0.0025
-
-    x_axis_label = [start_m + step_m * idx for idx in range(distance_velocity_map.shape[1])]
-    return x_axis_label
-
-def get_velocity_axis(config,max_sweep_rate):
-    #c=299792458
-    wavelength = 299792458.0 / 6e+10 / 2
-    prf = config.prf.frequency
-    
-    pri = 1.0/prf
-
-    if config.sweep_rate is not None:
-        sweep_rate = config.sweep_rate
-    else:
-        sweep_rate = max_sweep_rate
-
-    sweep_period = 1.0/sweep_rate
-
-    v_max=wavelength / (4*sweep_period)
-   
-    
-    velocities = np.linspace(-v_max, v_max, config.sweeps_per_frame)
-    return velocities
-
-
-
-def main():
-    args = a121.ExampleArgumentParser().parse_args()
+# session profile (name in profiles/ or path to a .toml/.json file, see profiles.py)
+PROFILE = "sparse_iq"
+
+def main(profile=PROFILE):
+    parser = a121.ExampleArgumentParser()
+    parser.add_argument("--profile", default=profile, help="session profile name or file (default: %(default)s)")
+    parser.add_argument("--streaming", action="store_true", help="process results while capturing")
+    parser.add_argument("--queue-size", type=int, default=8, help="results waiting for processing before acquisition blocks")
+    parser.add_argument("--record", metavar="PATH", help="also append every raw result to this recording file")
+    parser.add_argument("--select", type=parse_selection, action="append", metavar="G,S,SUB",
+                        help="group,sensor,subsweep to process (may be repeated, default: 1st subsweep of the last group)")
+    parser.add_argument("--maps", default="range_velocity_map.xmm", metavar="PATH",
+                        help="map store for the distance velocity maps, render them with map_store.py (default: %(default)s)")
+    args = parser.parse_args()
     et.utils.config_logging(args)
 
-    client = a121.Client.open(
+    # Create a SessionConfig with (e.g.) two groups SensorConfig, see profiles/sparse_iq.toml
+    # First group will contain multiple subsweeps, second group will contain single subsweep
+    # loaded before the client is opened, so an invalid profile fails before the sensor is connected
+    profile = load_profile(args.profile)
+    session_config = profile.session_config
+    sensor_id, _ = profile.first_sensor
+    # by default only the distance velocity map of the 1st subsweep of the last group
+    # (the second one in the default profile) is computed, e.g. --select 0,1,2 adds the 3rd subsweep of the first group
+    selection = args.select or [(len(session_config.groups) - 1, sensor_id, 0)]
+
+    client = open_client(
     # ip_address="<ip address of host (like a RPi). E.g. 192.168.XXX.YYY>",
     # or
     # serial_port="<serial port of module. E.g. COM3 or /dev/ttyUSBx for Window/Linux>",
@@ -57,100 +55,100 @@ def main():
     serial_port='COM4',
     override_baudrate=115200
 )
-    processor_config = ProcessorConfig()
-
-    processor_config.amplitude_method = AmplitudeMethod.COHERENT  # Either COHERENT or FFTMAX
-    sensor_id = 1
-
-    sensor_config = a121.SensorConfig(
-        sweeps_per_frame=8,
-        sweep_rate=None,
-        frame_rate=None,
-        inter_frame_idle_state=IdleState.READY,
-        inter_sweep_idle_state=IdleState.READY,
-        continuous_sweep_mode=False,
-        double_buffering=False,
-        subsweeps=[
-            # Generate 3 subsweep configurations
-            a121.SubsweepConfig(start_point=70),
-            a121.SubsweepConfig(),
-            a121.SubsweepConfig(profile=Profile.PROFILE_2),
-        ],
+
+    extended_metadata = profile.setup_session(client)
+    client.start_session()
+    recorder = Recorder(args.record, session_config, extended_metadata, client.server_info) if args.record else None
+    # Sparse IQ results contain amplitudes, phases, and distance velocity
+    # (computed like the sparse_iq Processor, but only for the selected subsweeps)
+    processor = SelectiveProcessor(
+        session_config, extended_metadata, selection, amplitude_method=AmplitudeMethod.COHERENT  # Either COHERENT or FFT_MAX
+    )
+    # range and velocity axes are fixed for the whole session
+    session_axes = SessionAxes(session_config, extended_metadata)
+
+    # every distance velocity map goes into one chunked, compressed file indexed by tick
+    # (see map_store.py), e.g. python map_store.py range_velocity_map.xmm --tick 1234 renders one as PNG
+    maps = MapWriter(
+        args.maps,
+        {
+            map_key(*key): (session_axes.distances(*key), session_axes.velocities(key[0], key[1]))
+            for key in selection
+        },
+        # SelectiveProcessor maps are linear magnitudes, like the sparse_iq Processor ones
+        db=False,
+        attributes={"session_config": json.loads(session_config.to_json())},
     )
 
-    # Multiple subsweep configuration can be assigned in single group SensorConfig
-    # through 'subweeps' fields shown above or in these way below
-    sensor_config.subsweeps[0].num_points = 140
-    sensor_config.subsweeps[1].prf = PRF.PRF_13_0_MHz
+    def show_result(result, processed):
+        # processed: {(group, sensor, subsweep): {"amplitudes": ..., "phases": ..., "distance_velocity_map": ...}}
+        for key, subsweep_result in processed.items():
+            group_idx, key_sensor_id, subsweep_idx = key
+            subsweep_config = session_config.groups[group_idx][key_sensor_id].subsweeps[subsweep_idx]
 
-    # Create a SessionConfig with (e.g.) two groups SensorConfig
-    # First group will contain multiple subsweeps, second group will contain single subsweep
-    # Multiple group configurations are required when certain parameters cannot be configured in subsweep config
-    session_config = a121.SessionConfig(
-        [
-            {
-                sensor_id: sensor_config,
-            },
-            {
-                sensor_id: a121.SensorConfig(
-                    sweeps_per_frame=20,
-                )
-            },
-        ],
-        extended=True,
-    )
-    client.setup_session(session_config)
-    client.start_session()
-    processor = Processor(session_config=session_config, processor_config=processor_config)
+            # sensor config
+            #https://docs.acconeer.com/en/latest/exploration_tool/api/a121.html
+            print(f"Distance velocity results of subsweep {subsweep_idx} from group {group_idx} ")
+            distance_velocity_map = subsweep_result["distance_velocity_map"]
+            print(distance_velocity_map)
+            print(f'size: {distance_velocity_map.shape}')
+            print(f'Maximum Measureable Distance: {subsweep_config.prf.mmd}')
+            print(f'Maximum Unambiguous Range: {subsweep_config.prf.mur}')
+            print(session_config.groups[group_idx][key_sensor_id])
+
+            maps.append(map_key(*key), result[group_idx][key_sensor_id].tick, distance_velocity_map)
+
+    def process_result(i, result):
+        show_result(result, processor.process(result))
 
     interrupt_handler = et.utils.ExampleInterruptHandler()
     print("Press Ctrl-C to end session")
+
+    if args.streaming:
+        # results are processed in a consumer thread while the producer thread keeps reading the sensor
+        def record_and_process(i, result):
+            if recorder is not None:
+                recorder.write(result)
+            process_result(i, result)
+
+        pipeline = StreamingPipeline(client, record_and_process, queue_size=args.queue_size)
+        pipeline.start()
+        while not interrupt_handler.got_signal and pipeline.running:
+            time.sleep(0.1)
+        print("Disconnecting...")
+        try:
+            pipeline.stop()
+        finally:
+            # also after a processing error, so the session ends and the files are complete
+            client.close()
+            if recorder is not None:
+                recorder.close()
+            maps.close()
+        print(pipeline.summary())
+        print(f"{args.maps}: {maps.summary()}")
+        return
+
     results=[]
     i=0
     while not interrupt_handler.got_signal:
         result = client.get_next()
         results.append(result)
+        if recorder is not None:
+            recorder.write(result)
         print(f'results {i} collected')
         i=i+1
     print("Disconnecting...")
     client.close()
-
-    for i,result in enumerate(results):
-        result_sensor_configs = processor.process(results=result)
-        result_first_sensor_config = result_sensor_configs[0][sensor_id]
-        result_third_subsweep = result_first_sensor_config[2]
-        # Sparse IQ results contain amplitudes, phases, and distance velocity
-        try:
-            #print("Amplitudes results of 3rd subsweep from first group ")
-            #print(result_third_subsweep.amplitudes)
-
-            # sensor config
-            #https://docs.acconeer.com/en/latest/exploration_tool/api/a121.html
-            print("Distance velocity results of 1st subsweep from second group ")
-            distance_velocity_map = result_sensor_configs[1][sensor_id][0].distance_velocity_map
-            print(distance_velocity_map)
-            print(f'size: {distance_velocity_map.shape}')
-            # sensor config of 1st subsweep from second group is in session_config.groups[1][sensor_id]
-            print(f'Maximum Measureable Distance: {session_config.groups[1][sensor_id].prf.mmd}')
-            print(f'Maximum Unambiguous Range: {session_config.groups[1][sensor_id].prf.mur}')
-            print(session_config.groups[1][sensor_id])
-            
-            x_axis_label = get_distance_axis(session_config.groups[1][sensor_id],distance_velocity_map)
-            y_axis_label = get_velocity_axis(session_config.groups[1][sensor_id],result[1][sensor_id]._context.metadata.max_sweep_rate)
-
-            plt.figure(figsize=(12, 8))
-            
-            plt.imshow(distance_velocity_map, aspect='auto', origin='lower', cmap='hot', interpolation='nearest',
-               extent=[x_axis_label[0], x_axis_label[-1], y_axis_label[0], y_axis_label[-1]])
-            plt.colorbar(label='Magnitude (dB)')
-            plt.xlabel('Range (m)')
-            plt.ylabel('Velocity (m/s)')
-            plt.title(f'range-doppler heatmap (results {i})')
-            plt.tight_layout()
-            plt.savefig(f'./range_velocity_map/results{i}.png')
-            
-        except et.PGProccessDiedException:
-            break
+    if recorder is not None:
+        recorder.close()
+
+    # all captured results are processed in batches, vectorized over the frames
+    batch_size = processor.batch_size()
+    for first, processed in processor.process_results(results, batch_size):
+        for i in range(first, min(first + batch_size, len(results))):
+            show_result(results[i], {key: {name: values[i - first] for name, values in outputs.items()} for key, outputs in processed.items()})
+    maps.close()
+    print(f"{args.maps}: {maps.summary()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from acconeer.exptool import a121
+from acconeer.exptool.a121.algo.sparse_iq import AmplitudeMethod
+
+from range_doppler import RangeDopplerEngine
+from recording import INT16_COMPLEX, _frame_words, to_complex
+
+# what the sparse_iq Processor computes for every subsweep
+OUTPUTS = ("amplitudes", "phases", "distance_velocity_map")
+
+# default size of a batch of complex64 subframes. Batches much larger than the
+# CPU caches are slower per frame than single frames
+BATCH_BYTES = 1 << 18
+
+
+def parse_selection(text: str) -> tuple[int, int, int]:
+    # "group,sensor,subsweep" (e.g. "1,1,0") as a selection key
+    try:
+        group_idx, sensor_id, subsweep_idx = (int(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected group,sensor,subsweep (e.g. 1,1,0), got {text!r}") from None
+    return group_idx, sensor_id, subsweep_idx
+
+
+class SelectiveProcessor:
+    # Computes what the sparse_iq Processor computes (amplitudes, phases and
+    # distance_velocity_map), but only for the selected (group index, sensor id,
+    # subsweep index) keys and only the requested outputs, instead of every
+    # subsweep of every group.
+    #
+    # It works on the raw int16 frames, converted to complex64, and takes any
+    # number of frames at once: process_frames() is vectorized over all leading
+    # axes, and process_results()/process_recording() feed it batches of frames.
+    # Outputs have the Processor's shapes with the frame axes in front.
+    def __init__(
+        self,
+        session_config: a121.SessionConfig,
+        extended_metadata: list[dict[int, a121.Metadata]],
+        selection,
+        amplitude_method: AmplitudeMethod = AmplitudeMethod.COHERENT,
+        outputs=OUTPUTS,
+    ) -> None:
+        if not session_config.extended:
+            raise ValueError("SelectiveProcessor needs an extended session config")
+        unknown = set(outputs) - set(OUTPUTS)
+        if unknown:
+            raise ValueError(f"unknown outputs {sorted(unknown)}, expected some of {OUTPUTS}")
+
+        self.selection = [tuple(key) for key in selection]
+        self.amplitude_method = amplitude_method
+        self.outputs = tuple(outputs)
+        # per key: its columns of the raw frame and the engine for its sweeps_per_frame
+        self._columns = {}
+        self._engines = {}
+        for group_idx, sensor_id, subsweep_idx in self.selection:
+            try:
+                sensor_config = session_config.groups[group_idx][sensor_id]
+                metadata = extended_metadata[group_idx][sensor_id]
+                sensor_config.subsweeps[subsweep_idx]
+            except (IndexError, KeyError):
+                raise ValueError(
+                    f"the session has no subsweep {subsweep_idx} of sensor {sensor_id} in group {group_idx}"
+                ) from None
+            offset = int(metadata.subsweep_data_offset[subsweep_idx])
+            key = (group_idx, sensor_id, subsweep_idx)
+            self._columns[key] = slice(offset, offset + int(metadata.subsweep_data_length[subsweep_idx]))
+            self._engines[key] = RangeDopplerEngine(sensor_config.sweeps_per_frame)
+
+    def process_frames(self, key, raw_frames: np.ndarray) -> dict[str, npt.NDArray]:
+        # raw_frames: (..., sweeps, points) whole raw frames of the sensor of `key`
+        raw_subframes = raw_frames[..., self._columns[key]]
+        needs_map = "distance_velocity_map" in self.outputs or (
+            "amplitudes" in self.outputs and self.amplitude_method == AmplitudeMethod.FFT_MAX
+        )
+        needs_complex = "phases" in self.outputs or (
+            "amplitudes" in self.outputs and self.amplitude_method != AmplitudeMethod.FFT_MAX
+        )
+
+        processed = {}
+        # converted once if anything besides the map needs the complex subframes
+        subframes = to_complex(raw_subframes) if needs_complex else None
+        if needs_map:
+            distance_velocity_map = self._engines[key].process(raw_subframes if subframes is None else subframes)
+            if "distance_velocity_map" in self.outputs:
+                processed["distance_velocity_map"] = distance_velocity_map
+        if needs_complex:
+            mean = subframes.mean(axis=-2)
+        if "amplitudes" in self.outputs:
+            if self.amplitude_method == AmplitudeMethod.COHERENT:
+                processed["amplitudes"] = np.abs(mean)
+            elif self.amplitude_method == AmplitudeMethod.NONCOHERENT:
+                processed["amplitudes"] = np.abs(subframes).mean(axis=-2)
+            else:
+                processed["amplitudes"] = distance_velocity_map.max(axis=-2)
+        if "phases" in self.outputs:
+            processed["phases"] = np.angle(mean)
+        return processed
+
+    def process(self, extended_result: list[dict[int, a121.Result]]) -> dict[tuple, dict[str, npt.NDArray]]:
+        # one get_next() result, {key: {output: array}}
+        return {
+            key: self.process_frames(key, extended_result[key[0]][key[1]]._frame) for key in self.selection
+        }
+
+    def batch_size(self) -> int:
+        # frames per batch so that the largest selected subsweep stays within BATCH_BYTES
+        largest = max(
+            engine.sweeps_per_frame * (columns.stop - columns.start) * np.dtype(np.complex64).itemsize
+            for engine, columns in zip(self._engines.values(), self._columns.values())
+        )
+        return max(1, BATCH_BYTES // largest)
+
+    def process_results(self, results, batch_size: int | None = None):
+        # yields (index of the first result, {key: {output: (batch, ...) array}})
+        # for a list of get_next() results, batch_size results at a time
+        batch_size = batch_size or self.batch_size()
+        for first in range(0, len(results), batch_size):
+            batch = results[first : first + batch_size]
+            yield first, {
+                key: self.process_frames(key, _stack_frames([result[key[0]][key[1]] for result in batch]))
+                for key in self.selection
+            }
+
+    def process_recording(self, recording, batch_size: int | None = None):
+        # same as process_results() for a recording (see recording.py); only the
+        # selected columns of each batch are read from the file
+        batch_size = batch_size or self.batch_size()
+        for first in range(0, len(recording), batch_size):
+            stop = min(first + batch_size, len(recording))
+            yield first, {
+                key: self.process_frames(key, recording.raw_frames(key[0], key[1])[first:stop])
+                for key in self.selection
+            }
+
+
+def _stack_frames(results) -> np.ndarray:
+    # the raw frames of many results as one array; stacked as uint32 words,
+    # since numpy copies structured arrays field by field
+    return np.stack([_frame_words(result._frame) for result in results]).view(INT16_COMPLEX)
+
+
+def compare_with_processor(session_config, extended_metadata, selection, num_frames=500, seed=0):
+    # Runs the same synthetic frames through the sparse_iq Processor (every
+    # subsweep, frame by frame) and through SelectiveProcessor (selected
+    # subsweeps, per result and batched), checks that they agree and reports frames/second.
+    from acconeer.exptool.a121.algo.sparse_iq import Processor, ProcessorConfig
+
+    from recording import make_result
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for i in range(num_frames):
+        extended_result = []
+        for group in extended_metadata:
+            group_result = {}
+            for sensor_id, metadata in group.items():
+                raw = np.zeros(
+                    (metadata.frame_data_length // metadata.sweep_data_length, metadata.sweep_data_length),
+                    dtype=INT16_COMPLEX,
+                )
+                raw["real"] = rng.integers(-2000, 2000, raw.shape)
+                raw["imag"] = rng.integers(-2000, 2000, raw.shape)
+                group_result[sensor_id] = make_result(raw, metadata, ticks_per_second=1000, tick=i)
+            extended_result.append(group_result)
+        results.append(extended_result)
+
+    processor_config = ProcessorConfig()
+    processor_config.amplitude_method = AmplitudeMethod.COHERENT
+    processor = Processor(session_config=session_config, processor_config=processor_config)
+    start = time.perf_counter()
+    processor_results = [processor.process(result) for result in results]
+    processor_time = time.perf_counter() - start
+
+    selective = SelectiveProcessor(session_config, extended_metadata, selection)
+    start = time.perf_counter()
+    for result in results:
+        selective.process(result)
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batches = list(selective.process_results(results))
+    batch_time = time.perf_counter() - start
+
+    max_error = 0.0
+    for first, batch in batches:
+        for (group_idx, sensor_id, subsweep_idx), processed in batch.items():
+            for name, values in processed.items():
+                expected = np.stack(
+                    [
+                        getattr(processor_result[group_idx][sensor_id][subsweep_idx], name)
+                        for processor_result in processor_results[first : first + len(values)]
+                    ]
+                )
+                if name == "phases":
+                    # angles close to +-pi may land on either side
+                    difference = np.abs(np.angle(np.exp(1j * (values - expected))))
+                else:
+                    difference = np.abs(values - expected) / np.max(np.abs(expected))
+                max_error = max(max_error, float(np.max(difference)))
+
+    num_subsweeps = sum(len(sensor_config.subsweeps) for group in session_config.groups for sensor_config in group.values())
+    print(f"{num_frames} frames, {len(selection)} of {num_subsweeps} subsweeps selected: {selection}")
+    print(f"max difference to Processor: {max_error:.1e} (relative to the peak, radians for phases)")
+    print(f"Processor:                 {num_frames / processor_time:10.1f} frames/s")
+    print(f"SelectiveProcessor:        {num_frames / single_time:10.1f} frames/s")
+    print(f"SelectiveProcessor batch:  {num_frames / batch_time:10.1f} frames/s")
+    if max_error > 1e-4:
+        raise AssertionError("SelectiveProcessor does not match the sparse_iq Processor")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare SelectiveProcessor with the sparse_iq Processor")
+    parser.add_argument("--profile", default="plot", help="session profile (see profiles.py)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--select", type=parse_selection, action="append", metavar="G,S,SUB",
+                        help="subsweep to process (default: the first subsweep of the last group)")
+    parser.add_argument("--frames", type=int, default=500)
+    args = parser.parse_args()
+
+    from profiles import load_profile
+
+    profile = load_profile(args.profile, args.overrides)
+    extended_metadata = profile.cached_metadata()
+    if extended_metadata is None:
+        # the metadata comes from a server, a mock one will do (not cached)
+        client = a121.Client.open(mock=True)
+        extended_metadata = client.setup_session(profile.session_config)
+        client.close()
+    session_config = profile.session_config
+    selection = args.select or [(len(session_config.groups) - 1, profile.first_sensor[0], 0)]
+    compare_with_processor(session_config, extended_metadata, selection, args.frames)
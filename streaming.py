@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+
+class StreamingPipeline:
+    # Runs client.get_next() in a producer thread and `process` in a consumer
+    # thread, connected by a bounded queue. When processing falls behind, the
+    # queue fills up and the producer blocks on put(), so memory stays bounded
+    # and the delay shows up as frame_delayed on the sensor side instead.
+    #
+    # process(index, result) is called for every result in acquisition order.
+    # Latency is measured from the acquisition tick of a result (mapped onto
+    # the host clock using the first result) until process() returns. Mean and
+    # max cover the whole session; percentiles cover the last `latency_capacity`
+    # results, kept in a preallocated ring so long captures use constant memory.
+    # on_receive(result), if given, is called in the producer thread right
+    # after get_next(), e.g. for AcquisitionStats.record.
+    def __init__(
+        self,
+        client,
+        process: Callable[[int, Any], None],
+        queue_size: int = 8,
+        report_interval: float = 5.0,
+        on_receive: Callable[[Any], None] | None = None,
+        latency_capacity: int = 4096,
+    ) -> None:
+        self.client = client
+        self.process = process
+        self.on_receive = on_receive
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.report_interval = report_interval
+
+        self.latencies_ms = np.zeros(latency_capacity)
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.num_received = 0
+        self.num_processed = 0
+        self.error: BaseException | None = None
+
+        self._stop_event = threading.Event()
+        self._tick_offset: float | None = None
+        self._producer = threading.Thread(target=self._produce, name="producer", daemon=True)
+        self._consumer = threading.Thread(target=self._consume, name="consumer", daemon=True)
+
+    def start(self) -> None:
+        self._producer.start()
+        self._consumer.start()
+
+    @property
+    def running(self) -> bool:
+        return self._consumer.is_alive()
+
+    def stop(self) -> None:
+        # Stops acquisition and waits until everything already queued is processed.
+        # Then raises the error of get_next() or process(), if there was one, so
+        # callers close the client and their files in a finally.
+        self._stop_event.set()
+        self._producer.join()
+        self._consumer.join()
+        if self.error is not None:
+            raise self.error
+
+    def _acquisition_time(self, result, received: float) -> float:
+        # host time (perf_counter) at which the sensor acquired `result`
+        entry = _first_entry(result)
+        tick_time = entry.tick_time
+        if self._tick_offset is None:
+            self._tick_offset = received - tick_time
+        return self._tick_offset + tick_time
+
+    def _put(self, item) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                result = self.client.get_next()
+                acquired = self._acquisition_time(result, time.perf_counter())
+                if self.on_receive is not None:
+                    self.on_receive(result)
+                if not self._put((self.num_received, acquired, result)):
+                    break
+                self.num_received += 1
+        except BaseException as e:
+            self.error = e
+            self._stop_event.set()
+        finally:
+            # the consumer is draining the queue, so this can not block forever
+            self.queue.put(None)
+
+    def _consume(self) -> None:
+        last_report = time.perf_counter()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+
+            index, acquired, result = item
+            try:
+                self.process(index, result)
+            except BaseException as e:
+                self.error = e
+                self._stop_event.set()
+                continue
+
+            now = time.perf_counter()
+            latency_ms = (now - acquired) * 1000
+            self.latencies_ms[self.num_processed % len(self.latencies_ms)] = latency_ms
+            self.latency_sum_ms += latency_ms
+            self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+            self.num_processed += 1
+
+            if self.report_interval > 0 and now - last_report >= self.report_interval:
+                print(self.summary())
+                last_report = now
+
+    def summary(self) -> str:
+        if self.num_processed == 0:
+            return "no results processed"
+        # the ring is only partly filled during the first latency_capacity results
+        recent = self.latencies_ms[: min(self.num_processed, len(self.latencies_ms))]
+        return (
+            f"processed {self.num_processed}/{self.num_received} results, "
+            f"queue {self.queue.qsize()}/{self.queue.maxsize}, latency ms "
+            f"mean {self.latency_sum_ms / self.num_processed:.1f} p50 {np.percentile(recent, 50):.1f} "
+            f"p99 {np.percentile(recent, 99):.1f} max {self.latency_max_ms:.1f}"
+        )
+
+
+def _first_entry(result):
+    # extended results are list[dict[int, a121.Result]]
+    if isinstance(result, list):
+        return next(iter(result[0].values()))
+    return result